@@ -0,0 +1 @@
+../../pygdal/_gdal_array_ext.py
\ No newline at end of file
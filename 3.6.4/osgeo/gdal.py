@@ -4957,3 +4957,6 @@ def wrapper_GDALMultiDimTranslateDestName(*args) -> "GDALDatasetShadow *":
     return _gdal.wrapper_GDALMultiDimTranslateDestName(*args)
 
 
+
+# Hand-maintained extensions, see pygdal/_gdal_ext.py
+from osgeo._gdal_ext import *
@@ -698,3 +698,6 @@ def CopyDatasetInfo(src, dst, xoff=0, yoff=0):
 
 
 
+
+# Hand-maintained extensions, see pygdal/_gdal_array_ext.py
+from osgeo._gdal_array_ext import *
@@ -7,6 +7,20 @@ from shutil import copytree, rmtree
 parser = argparse.ArgumentParser()
 parser.add_argument("version")
 
+# Versions whose bindings are extended by the hand-maintained modules of
+# pygdal/: _<module>_ext.py is linked into their osgeo package, and
+# imported at the end of the SWIG generated <module>.py.
+EXTENDED_VERSIONS = ("3.6.4",)
+EXTENDED_MODULES = ("gdal", "gdal_array")
+
+
+def extend(osgeo):
+    for module in EXTENDED_MODULES:
+        (osgeo / f"_{module}_ext.py").symlink_to(f"../../pygdal/_{module}_ext.py")
+        with (osgeo / f"{module}.py").open("a") as f:
+            f.write(f"\n# Hand-maintained extensions, see pygdal/_{module}_ext.py\n"
+                    f"from osgeo._{module}_ext import *\n")
+
 
 if __name__ == "__main__":
     args = parser.parse_args()
@@ -58,6 +72,9 @@ if __name__ == "__main__":
             "-f", "ws_comma", "-f", "xrange",
             str(py3))
 
+    if args.version in EXTENDED_VERSIONS:
+        extend(unpack / "osgeo")
+
     (base / 'GDAL_VERSION').write_text(args.version)
     for s in ("setup.py", "MANIFEST.in", "README.md"):
         (base / s).symlink_to("../" + s)
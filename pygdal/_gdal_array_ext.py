@@ -0,0 +1,2898 @@
+# Hand-maintained extensions of the gdal_array module of the GDAL bindings,
+# kept out of the SWIG generated gdal_array.py so that they survive its
+# regeneration. import.py links this module into the osgeo package of the
+# versions it applies to, and appends to their gdal_array.py:
+#
+#     from osgeo._gdal_array_ext import *
+#
+# which adds the functions and classes of __all__ to the gdal_array
+# module, the ones of the same name being replaced.
+
+import collections
+import itertools
+import sys
+import threading
+import weakref
+
+import numpy
+
+from osgeo import gdal
+from osgeo import gdalconst
+from osgeo.gdal_array import *
+from osgeo.gdal_array import _ExtendedDataTypeToNumPyDataType, _RaiseException
+from osgeo._gdal_ext import _FileSignature
+
+
+__all__ = [
+    'flip_code', 'RasterInfo', 'GetRasterInfo', 'BufferPool', 'SetBufferPool',
+    'GetBufferPool', 'TileCache', 'LoadFile', 'SaveArrayChunked',
+    'SharedReadPool', 'DatasetReadAsArray', 'BandReadAsArray',
+    'DatasetReadAsMaskedArray', 'BandReadAsMaskedArray', 'BandIterBlocks',
+    'DatasetIterBlocks', 'DatasetSamplePoints', 'ZonalStatistics', 'MapBlocks',
+    'StreamWriter', 'AsyncWriter', 'LazyArray', 'ClearMDArrayHandles',
+    'MDArrayReadAsArray', 'MDArrayReadSlice', 'MDArrayIterChunks',
+    'MDArrayStreamWriter', 'RATWriteArray', 'RATWriteColumns',
+    'RATReadStructuredArray', 'CopyDatasetInfo'
+]
+
+
+# Reverse mapping of codes. Several GDAL types map to complex64, so the first
+# one wins, except for the exact matches selected below (ticket 1518).
+_numpy_codes = {}
+for _gdal_code, _numpy_type in codes.items():
+    _numpy_codes.setdefault(numpy.dtype(_numpy_type), _gdal_code)
+_numpy_codes[numpy.dtype(numpy.int8)] = gdalconst.GDT_Byte
+_numpy_codes[numpy.dtype(numpy.complex64)] = gdalconst.GDT_CFloat32
+del _gdal_code, _numpy_type
+
+
+def flip_code(code):
+    if isinstance(code, (numpy.dtype, type)):
+# since several things map to complex64 we must carefully select
+# the opposite that is an exact match (ticket 1518)
+        try:
+            return _numpy_codes[numpy.dtype(code)]
+        except (KeyError, TypeError):
+            pass
+        if code == numpy.int8:
+            return gdalconst.GDT_Byte
+        if code == numpy.complex64:
+            return gdalconst.GDT_CFloat32
+
+        for key, value in codes.items():
+            if value == code:
+                return key
+        return None
+    else:
+        try:
+            return codes[code]
+        except KeyError:
+            return None
+
+
+class RasterInfo(collections.namedtuple('RasterInfo', [
+        'xsize', 'ysize', 'count', 'data_types', 'typecodes', 'block_sizes',
+        'nodata', 'scales', 'offsets', 'signed_byte'])):
+    """
+    Immutable snapshot of the raster properties of a dataset, with one
+    entry per band in each of the tuple fields. typecodes are the numpy
+    types in which the bands are read by default, taking into account
+    signed byte bands.
+
+    Values reflect the state of the dataset when the snapshot was taken.
+    """
+
+    __slots__ = ()
+
+# ds -> (xsize, ysize, count, data_types, block_sizes), which can't change
+# once the bands are created
+_raster_layouts = weakref.WeakKeyDictionary()
+
+def _RasterLayout(ds, refresh=False):
+    """Return the cached (xsize, ysize, count, data_types, block_sizes) of
+    ds, recomputed when the number of bands changed or refresh is True."""
+
+    try:
+        layout = _raster_layouts[ds]
+    except (KeyError, TypeError):
+        layout = None
+    if layout is not None and not refresh and layout[2] == ds.RasterCount:
+        return layout
+
+    bands = [ds.GetRasterBand(i + 1) for i in range(ds.RasterCount)]
+    layout = (ds.RasterXSize, ds.RasterYSize, len(bands),
+              tuple(band.DataType for band in bands),
+              tuple(tuple(band.GetBlockSize()) for band in bands))
+    try:
+        _raster_layouts[ds] = layout
+    except TypeError:
+        pass
+    return layout
+
+def _IsSignedByte(band, data_type):
+    return data_type == gdalconst.GDT_Byte and \
+        band.GetMetadataItem('PIXELTYPE', 'IMAGE_STRUCTURE') == 'SIGNEDBYTE'
+
+def GetRasterInfo(ds, refresh=False):
+    """
+    Return a RasterInfo snapshot of ds.
+
+    The sizes, data types and block sizes are cached for the lifetime of
+    the ds object, and recomputed when the number of bands changed or
+    refresh is True. The nodata values, scales, offsets and signed byte
+    flags, which can be changed, are read on each call.
+    """
+
+    xsize, ysize, count, data_types, block_sizes = _RasterLayout(ds, refresh)
+    bands = [ds.GetRasterBand(i + 1) for i in range(count)]
+    signed_byte = tuple(_IsSignedByte(band, data_type)
+                        for band, data_type in zip(bands, data_types))
+    return RasterInfo(
+        xsize=xsize,
+        ysize=ysize,
+        count=count,
+        data_types=data_types,
+        typecodes=tuple(numpy.int8 if signed else codes.get(data_type)
+                        for data_type, signed in zip(data_types, signed_byte)),
+        block_sizes=block_sizes,
+        nodata=tuple(band.GetNoDataValue() for band in bands),
+        scales=tuple(band.GetScale() for band in bands),
+        offsets=tuple(band.GetOffset() for band in bands),
+        signed_byte=signed_byte)
+
+def _RefCount(buffers, i):
+    return sys.getrefcount(buffers[i])
+
+# Reference count of an array only referenced by the list of a BufferPool
+_POOLED_REFCOUNT = _RefCount([numpy.empty(0)], 0)
+
+class BufferPool(object):
+    """Pool of NumPy arrays, reused by the read functions of this module
+    when they have to allocate their output buffer. See SetBufferPool().
+
+    Arrays are kept per (shape, dtype) in least recently used order, within
+    a budget of max_bytes. A pooled array is handed out again only once the
+    pool holds the last reference to it (arrays that are still referenced,
+    directly or through a view, are never reused). The hits and misses
+    attributes count the requests served from the pool or by a new
+    allocation."""
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._buffers = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def Empty(self, shape, dtype):
+        """Return an uninitialized array of the requested shape and dtype."""
+        key = (tuple(shape), numpy.dtype(dtype))
+        with self._lock:
+            buffers = self._buffers.get(key, [])
+            for i in range(len(buffers)):
+                if _RefCount(buffers, i) == _POOLED_REFCOUNT:
+                    self._buffers.move_to_end(key)
+                    self.hits += 1
+                    # may have been made read-only by a TileCache
+                    buffers[i].setflags(write=True)
+                    return buffers[i]
+
+            self.misses += 1
+            array = numpy.empty(shape, dtype=dtype)
+            if self.nbytes + array.nbytes > self.max_bytes:
+                self._Evict(self.max_bytes - array.nbytes)
+            if self.nbytes + array.nbytes <= self.max_bytes:
+                self._buffers.setdefault(key, []).append(array)
+                self._buffers.move_to_end(key)
+                self.nbytes += array.nbytes
+            return array
+
+    def _Evict(self, max_bytes):
+        for key in list(self._buffers):
+            if self.nbytes <= max_bytes:
+                return
+            buffers = self._buffers[key]
+            for i in reversed(range(len(buffers))):
+                if self.nbytes > max_bytes and _RefCount(buffers, i) == _POOLED_REFCOUNT:
+                    self.nbytes -= buffers[i].nbytes
+                    del buffers[i]
+            if not buffers:
+                del self._buffers[key]
+
+    def Clear(self):
+        """Forget all pooled arrays and reset the counters."""
+        with self._lock:
+            self._buffers.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+_buffer_pool = None
+
+def SetBufferPool(pool):
+    """Make BandReadAsArray() and DatasetReadAsArray() allocate their output
+    arrays from pool, a BufferPool. None disables pooling."""
+    global _buffer_pool
+    _buffer_pool = pool
+
+def GetBufferPool():
+    """Return the BufferPool set with SetBufferPool(), or None."""
+    return _buffer_pool
+
+def _EmptyBuffer(shape, dtype):
+    pool = _buffer_pool
+    if pool is None:
+        return numpy.empty(shape, dtype=dtype)
+    return pool.Empty(shape, dtype)
+
+class TileCache(object):
+    """Cache of arrays derived from rasters, such as the results of
+    ReadAsArray(), shared across datasets and evicted in least recently
+    used order within a budget of max_bytes.
+
+    Keys are tuples, usually built with Key() and possibly extended to
+    identify further processing. Cached arrays are made read-only, since
+    they are returned to all callers without copy. The cache does not track
+    modifications of the underlying files: use Invalidate() after writing
+    to them. The hits and misses attributes count the lookups."""
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._arrays = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._arrays)
+
+    @staticmethod
+    def Key(ds, xoff=0, yoff=0, win_xsize=None, win_ysize=None,
+            buf_xsize=None, buf_ysize=None, buf_type=None,
+            resample_alg=gdal.GRIORA_NearestNeighbour, band_list=None,
+            interleave='band'):
+        """Return the key identifying a read of a Band or Dataset with the
+        given arguments, or None if the object has no path to identify it
+        (for instance a MEM dataset). Besides its path, the dataset is
+        identified by its raster layout, or that of the band, as open
+        options can not be retrieved."""
+
+        if isinstance(ds, gdal.Band):
+            bands = (ds.GetBand(),)
+            if win_xsize is None:
+                win_xsize = ds.XSize
+            if win_ysize is None:
+                win_ysize = ds.YSize
+            # GetDataset() returns a new object at each call, which would
+            # never be found in the cache of _RasterLayout()
+            layout = (ds.XSize, ds.YSize, ds.DataType, tuple(ds.GetBlockSize()))
+            ds = ds.GetDataset()
+            if ds is None or bands[0] <= 0:
+                return None
+            interleave = None
+        else:
+            if band_list is None:
+                band_list = range(1, ds.RasterCount + 1)
+            bands = tuple(band_list)
+            if win_xsize is None:
+                win_xsize = ds.RasterXSize
+            if win_ysize is None:
+                win_ysize = ds.RasterYSize
+            interleave = interleave.lower()
+            layout = None
+        path = ds.GetDescription()
+        if not path or ds.GetDriver().ShortName == 'MEM':
+            return None
+        # Datasets opened from the same path with open options changing their
+        # content (e.g. OVERVIEW_LEVEL) are told apart by their sizes, data
+        # types and block sizes
+        if layout is None:
+            layout = _RasterLayout(ds)
+        return (path, layout, bands, (xoff, yoff, win_xsize, win_ysize),
+                (win_xsize if buf_xsize is None else buf_xsize,
+                 win_ysize if buf_ysize is None else buf_ysize),
+                buf_type, resample_alg, interleave)
+
+    def Get(self, key):
+        """Return the array cached for key, or None."""
+        with self._lock:
+            array = self._arrays.get(key)
+            if array is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._arrays.move_to_end(key)
+            return array
+
+    def Put(self, key, array):
+        """Cache array for key, make it read-only and return it. Arrays
+        larger than max_bytes are returned without being cached."""
+        array.setflags(write=False)
+        with self._lock:
+            old = self._arrays.pop(key, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            if array.nbytes > self.max_bytes:
+                return array
+            while self._arrays and self.nbytes + array.nbytes > self.max_bytes:
+                self.nbytes -= self._arrays.popitem(last=False)[1].nbytes
+            self._arrays[key] = array
+            self.nbytes += array.nbytes
+        return array
+
+    def GetOrCompute(self, key, func):
+        """Return the array cached for key, computing it with func() and
+        caching it on a miss. Results of func() that are None are not
+        cached."""
+        array = self.Get(key)
+        if array is None:
+            array = func()
+            if array is not None:
+                array = self.Put(key, array)
+        return array
+
+    def Invalidate(self, path=None):
+        """Drop the arrays read from path, or all arrays if path is None.
+        Only keys built with Key() are matched against path."""
+        with self._lock:
+            for key in list(self._arrays):
+                if path is None or key[0] == path:
+                    self.nbytes -= self._arrays.pop(key).nbytes
+
+    def Clear(self):
+        """Forget all cached arrays and reset the counters."""
+        with self._lock:
+            self._arrays.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+def LoadFile(filename, xoff=0, yoff=0, xsize=None, ysize=None,
+             buf_xsize=None, buf_ysize=None, buf_type=None,
+             resample_alg=gdal.GRIORA_NearestNeighbour,
+             callback=None, callback_data=None, interleave='band',
+             band_list=None):
+    pool = gdal.GetDatasetPool()
+    ds = gdal.Open(filename) if pool is None else pool.Open(filename)
+    if ds is None:
+        raise ValueError("Can't open "+filename+"\n\n"+gdal.GetLastErrorMsg())
+
+    return DatasetReadAsArray(ds, xoff, yoff, xsize, ysize,
+                              buf_xsize=buf_xsize, buf_ysize=buf_ysize, buf_type=buf_type,
+                              resample_alg=resample_alg,
+                              callback=callback, callback_data=callback_data,
+                              interleave=interleave,
+                              band_list=band_list)
+
+
+def SaveArrayChunked(src, filename, format="GTiff", options=None, prototype=None,
+                     interleave='band', xsize=None, ysize=None, bands=1, dtype=None,
+                     max_bytes=64 * 1024 * 1024):
+    """
+    Save an array to a new file, writing it incrementally so that only a
+    bounded amount of data is held in memory.
+
+    src is either a numpy array (typically a memmap) of shape
+    (ysize, xsize), (bands, ysize, xsize) if interleave is 'band', or
+    (ysize, xsize, bands) if interleave is 'pixel', or an iterable of
+    (array, xoff, yoff) windows of such arrays, in which case xsize, ysize,
+    bands and dtype must be specified. Arrays are written block by block,
+    and windows are coalesced into whole blocks with a StreamWriter holding
+    at most max_bytes.
+
+    options are the creation options, for instance
+    ['TILED=YES', 'COMPRESS=DEFLATE', 'NUM_THREADS=ALL_CPUS']. Formats that
+    only support CreateCopy(), such as COG, are written through a temporary
+    tiled GTiff file next to filename, or in the default temporary directory
+    for /vsi filenames.
+    """
+
+    import os
+    import tempfile
+
+    driver = gdal.GetDriverByName(format)
+    if driver is None:
+        raise ValueError("Can't find driver "+format)
+
+    interleave = interleave.lower()
+    if interleave not in ('band', 'pixel'):
+        raise ValueError('Interleave should be band or pixel')
+
+    if hasattr(src, 'shape') and hasattr(src, 'dtype'):
+        if len(src.shape) == 2:
+            ysize, xsize = src.shape
+            bands = 1
+        elif len(src.shape) == 3 and interleave == 'band':
+            bands, ysize, xsize = src.shape
+        elif len(src.shape) == 3:
+            ysize, xsize, bands = src.shape
+        else:
+            raise ValueError("expected array of dim 2 or 3")
+        dtype = src.dtype
+    elif xsize is None or ysize is None or dtype is None:
+        raise ValueError("xsize, ysize and dtype must be specified for an iterable of windows")
+
+    datatype = NumericTypeCodeToGDALTypeCode(numpy.dtype(dtype).type)
+    if not datatype:
+        raise ValueError("array does not have corresponding GDAL data type")
+
+    if options is None:
+        options = []
+    tmp_filename = None
+    if driver.GetMetadataItem(gdalconst.DCAP_CREATE) == 'YES':
+        ds = driver.Create(filename, xsize, ysize, bands, datatype, options)
+    else:
+        # next to filename, unless it is a virtual file (/vsimem/, /vsis3/, ...)
+        tmp_dir = None if filename.startswith('/vsi') else \
+            os.path.dirname(os.path.abspath(filename))
+        fd, tmp_filename = tempfile.mkstemp(suffix='.tif', dir=tmp_dir)
+        os.close(fd)
+        ds = gdal.GetDriverByName('GTiff').Create(
+            tmp_filename, xsize, ysize, bands, datatype,
+            ['TILED=YES', 'BLOCKXSIZE=512', 'BLOCKYSIZE=512', 'BIGTIFF=IF_SAFER'])
+    if ds is None:
+        if tmp_filename is not None:
+            os.remove(tmp_filename)
+        _RaiseException()
+        return None
+
+    try:
+        if prototype is not None:
+            if type(prototype).__name__ == 'str':
+                prototype = gdal.Open(prototype)
+            if prototype is not None:
+                CopyDatasetInfo(prototype, ds)
+
+        if hasattr(src, 'shape') and hasattr(src, 'dtype'):
+            block_xsize, block_ysize = ds.GetRasterBand(1).GetBlockSize()
+            for xoff, yoff, win_xsize, win_ysize in _BlockWindows(xsize, ysize,
+                                                                  block_xsize, block_ysize):
+                if len(src.shape) == 2:
+                    window = src[yoff:yoff + win_ysize, xoff:xoff + win_xsize]
+                elif interleave == 'band':
+                    window = src[:, yoff:yoff + win_ysize, xoff:xoff + win_xsize]
+                elif bands == 1:
+                    window = src[yoff:yoff + win_ysize, xoff:xoff + win_xsize, 0]
+                else:
+                    window = src[yoff:yoff + win_ysize, xoff:xoff + win_xsize, :]
+                if DatasetWriteArray(ds, numpy.asarray(window), xoff, yoff,
+                                     interleave=interleave) != 0:
+                    return None
+        else:
+            with StreamWriter(ds, max_bytes=max_bytes) as writer:
+                for array, xoff, yoff in src:
+                    array = numpy.asarray(array)
+                    if interleave == 'pixel' and len(array.shape) == 3:
+                        array = numpy.moveaxis(array, 2, 0)
+                    if writer.Write(array, xoff, yoff) != 0:
+                        return None
+
+        if tmp_filename is None:
+            ds.FlushCache()
+            return ds
+
+        ds.FlushCache()
+        return driver.CreateCopy(filename, ds, options=options)
+    finally:
+        if tmp_filename is not None:
+            ds = None
+            gdal.GetDriverByName('GTiff').Delete(tmp_filename)
+
+
+def _BlockAlignedSplits(off, size, block_size, nparts):
+    """Split the range [off, off + size) in at most nparts contiguous parts,
+    whose inner boundaries are multiples of block_size. Returns a list of
+    (start, count) tuples, with start relative to off."""
+
+    block_size = max(1, block_size)
+    first_block = off // block_size
+    nblocks = (off + size - 1) // block_size - first_block + 1
+    nparts = max(1, min(nparts, nblocks))
+
+    splits = []
+    start = off
+    for i in range(1, nparts + 1):
+        end = min((first_block + (nblocks * i) // nparts) * block_size, off + size)
+        if end > start:
+            splits.append((start - off, end - start))
+            start = end
+    return splits
+
+def _DatasetBufType(ds, band_list, buf_type):
+    """Return the (buf_type, typecode) pair used to read band_list of ds
+    when no buffer is provided."""
+
+    data_types = _RasterLayout(ds)[3]
+    if buf_type is None:
+        buf_type = data_types[band_list[0] - 1]
+        for band_index in band_list[1:]:
+            if buf_type != data_types[band_index - 1]:
+                buf_type = gdalconst.GDT_Float32
+
+    typecode = GDALTypeCodeToNumericTypeCode(buf_type)
+    if typecode is None:
+        buf_type = gdalconst.GDT_Float32
+        typecode = numpy.float32
+    else:
+        buf_type = NumericTypeCodeToGDALTypeCode(typecode)
+
+    if _IsSignedByte(ds.GetRasterBand(band_list[0]), buf_type):
+        typecode = numpy.int8
+    return buf_type, typecode
+
+def _ReopenInfo(ds):
+    """Flush the pending writes of ds, so that other handles on its file
+    see them, and return what _Reopen() needs to open ds again from another
+    thread, or None if it can't be (no description, MEM dataset)."""
+
+    if ds is None:
+        return None
+    filename = ds.GetDescription()
+    driver = ds.GetDriver()
+    if not filename or driver is None or driver.ShortName == 'MEM':
+        return None
+    ds.FlushCache()
+    return filename, driver.ShortName, _RasterLayout(ds)
+
+def _Reopen(reopen_info, open_ex=gdal.OpenEx):
+    """Open again the dataset described by reopen_info with open_ex, which
+    has the signature of gdal.OpenEx() (for instance DatasetPool.OpenEx).
+    Return None, without raising or reporting an error, if it can't be
+    opened, or if the new handle doesn't have the raster layout of the
+    original one: open options, such as OVERVIEW_LEVEL, can't be retrieved
+    from a dataset, and are detected that way."""
+
+    filename, driver, layout = reopen_info
+    gdal.PushErrorHandler('CPLQuietErrorHandler')
+    try:
+        ds = open_ex(filename, gdal.OF_RASTER, [driver])
+    except RuntimeError:
+        ds = None
+    finally:
+        gdal.PopErrorHandler()
+    if ds is None or _RasterLayout(ds) != layout:
+        return None
+    return ds
+
+def _DatasetReadAsArrayThreaded(ds, xoff, yoff, win_xsize, win_ysize, buf_obj,
+                                buf_type, resample_alg, interleave, band_list,
+                                threads):
+    """Read a window of ds by splitting it in block aligned strips that are
+    read concurrently, each thread opening its own dataset handle (see
+    _Reopen()), or using the source handle in turn if it can't."""
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    pixel_interleave = interleave.lower() == 'pixel'
+    nbands = len(band_list)
+    if buf_obj is None:
+        buf_type, typecode = _DatasetBufType(ds, band_list, buf_type)
+        if nbands == 1:
+            buf_shape = (win_ysize, win_xsize)
+        elif pixel_interleave:
+            buf_shape = (win_ysize, win_xsize, nbands)
+        else:
+            buf_shape = (nbands, win_ysize, win_xsize)
+        buf_obj = _EmptyBuffer(buf_shape, typecode)
+
+    ydim = 0 if (len(buf_obj.shape) == 2 or pixel_interleave) else 1
+    block_ysize = ds.GetRasterBand(band_list[0]).GetBlockSize()[1]
+    splits = _BlockAlignedSplits(yoff, win_ysize, block_ysize, threads) \
+        if win_xsize and win_ysize else []
+    if not splits:
+        return buf_obj
+
+    reopen_info = _ReopenInfo(ds)
+    handles = threading.local()
+    ds_lock = threading.Lock()
+
+    def read_strip(split):
+        start, count = split
+        index = [slice(None)] * len(buf_obj.shape)
+        index[ydim] = slice(start, start + count)
+        kwargs = dict(buf_obj=buf_obj[tuple(index)], buf_type=buf_type,
+                      resample_alg=resample_alg, interleave=interleave,
+                      band_list=band_list)
+
+        if not hasattr(handles, 'ds'):
+            handles.ds = _Reopen(reopen_info) if reopen_info is not None else None
+        thread_ds = handles.ds
+        if thread_ds is None:
+            with ds_lock:
+                return DatasetReadAsArray(ds, xoff, yoff + start, win_xsize, count, **kwargs)
+        return DatasetReadAsArray(thread_ds, xoff, yoff + start, win_xsize, count, **kwargs)
+
+    with ThreadPoolExecutor(max_workers=len(splits)) as executor:
+        results = list(executor.map(read_strip, splits))
+
+    if any(result is None for result in results):
+        return None
+    return buf_obj
+
+def _AttachSharedMemory(name):
+    from multiprocessing import shared_memory
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13
+        return shared_memory.SharedMemory(name=name)
+
+def _ReleaseSharedMemory(shm):
+    """Free the shared memory output of a SharedReadPool."""
+    try:
+        shm.close()
+    except BufferError:
+        # Still exported to live arrays: the mapping is released with them
+        pass
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+# filename -> (dataset, file signature) opened by the worker processes of
+# SharedReadPool
+_shared_read_datasets = {}
+
+def _SharedReadStrip(shm_name, shape, dtype, filename, xoff, yoff, win_xsize,
+                     start, count, ydim, buf_type, interleave, band_list):
+    """Read a strip of a window into the shared memory output of a
+    SharedReadPool. Runs in a worker process."""
+
+    signature = _FileSignature(filename)
+    ds, ds_signature = _shared_read_datasets.get(filename, (None, None))
+    if ds is None or ds_signature != signature:
+        ds = gdal.Open(filename)
+        if ds is None:
+            _shared_read_datasets.pop(filename, None)
+            raise RuntimeError("Can't open " + filename)
+        _shared_read_datasets[filename] = (ds, signature)
+
+    shm = _AttachSharedMemory(shm_name)
+    try:
+        array = numpy.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        index = [slice(None)] * len(shape)
+        index[ydim] = slice(start, start + count)
+        ret = DatasetReadAsArray(ds, xoff, yoff + start, win_xsize, count,
+                                 buf_obj=array[tuple(index)], buf_type=buf_type,
+                                 interleave=interleave, band_list=band_list)
+        del array
+    finally:
+        shm.close()
+    if ret is None:
+        raise RuntimeError(gdal.GetLastErrorMsg())
+
+class SharedReadPool(object):
+    """Pool of worker processes reading rasters into shared memory.
+
+    ReadAsArray() allocates its output in a multiprocessing.shared_memory
+    block, and the workers, each with their own dataset handles, read
+    disjoint block aligned strips of the window directly into it. The
+    returned array is a view on the shared memory: nothing is copied or
+    pickled back. The shared memory of an array is freed when it is
+    garbage collected, or by Release(array) or Close(), after which the
+    array must not be used.
+
+    The workers keep their dataset handles open for the next reads, and
+    reopen a file when its modification time or size changes. ClearCache()
+    closes them all."""
+
+    def __init__(self, processes=None):
+        import os
+        self.processes = processes or os.cpu_count() or 1
+        self._executor = None
+        # weakref.finalize objects freeing the shared memory of the arrays
+        self._finalizers = []
+
+    def ReadAsArray(self, filename, xoff=0, yoff=0, win_xsize=None, win_ysize=None,
+                    buf_type=None, interleave='band', band_list=None):
+        """Read a window of filename, with the same conventions as
+        DatasetReadAsArray()."""
+
+        from concurrent.futures import ProcessPoolExecutor
+        from multiprocessing import shared_memory
+
+        ds = gdal.Open(filename)
+        if ds is None:
+            raise ValueError("Can't open "+filename+"\n\n"+gdal.GetLastErrorMsg())
+        if win_xsize is None:
+            win_xsize = ds.RasterXSize
+        if win_ysize is None:
+            win_ysize = ds.RasterYSize
+        if band_list is None:
+            band_list = list(range(1, ds.RasterCount + 1))
+        if not band_list:
+            return None
+
+        pixel_interleave = interleave.lower() == 'pixel'
+        nbands = len(band_list)
+        buf_type, typecode = _DatasetBufType(ds, band_list, buf_type)
+        if nbands == 1:
+            shape = (win_ysize, win_xsize)
+        elif pixel_interleave:
+            shape = (win_ysize, win_xsize, nbands)
+        else:
+            shape = (nbands, win_ysize, win_xsize)
+        ydim = 0 if (nbands == 1 or pixel_interleave) else 1
+        dtype = numpy.dtype(typecode)
+        block_ysize = ds.GetRasterBand(band_list[0]).GetBlockSize()[1]
+        ds = None
+
+        shm = shared_memory.SharedMemory(create=True,
+                                         size=max(1, int(numpy.prod(shape)) * dtype.itemsize))
+        array = numpy.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        finalizer = weakref.finalize(array, _ReleaseSharedMemory, shm)
+        self._finalizers = [f for f in self._finalizers if f.alive]
+        self._finalizers.append(finalizer)
+
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.processes)
+        try:
+            futures = [self._executor.submit(_SharedReadStrip, shm.name, shape, dtype.str,
+                                             filename, xoff, yoff, win_xsize, start, count,
+                                             ydim, buf_type, interleave, band_list)
+                       for start, count in _BlockAlignedSplits(yoff, win_ysize, block_ysize,
+                                                               4 * self.processes)]
+            for future in futures:
+                future.result()
+        except BaseException:
+            finalizer()
+            raise
+        return array
+
+    def Release(self, array):
+        """Free the shared memory of array, returned by ReadAsArray(), without
+        waiting for it to be garbage collected. array and its views must not
+        be used afterwards."""
+        for finalizer in self._finalizers:
+            info = finalizer.peek()
+            if info is not None and info[0] is array:
+                finalizer()
+                return
+        raise ValueError("array was not returned by this pool, or was already released")
+
+    def ClearCache(self):
+        """Close the dataset handles kept by the worker processes, which are
+        restarted by the next read."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def Close(self):
+        """Stop the worker processes and free the shared memory of the
+        arrays returned by ReadAsArray()."""
+        self.ClearCache()
+        for finalizer in self._finalizers:
+            finalizer()
+        self._finalizers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.Close()
+
+def DatasetReadAsArray(ds, xoff=0, yoff=0, win_xsize=None, win_ysize=None, buf_obj=None,
+                       buf_xsize=None, buf_ysize=None, buf_type=None,
+                       resample_alg=gdal.GRIORA_NearestNeighbour,
+                       callback=None, callback_data=None, interleave='band',
+                       band_list=None, threads=None, cache=None):
+    """Pure python implementation of reading a chunk of a GDAL file
+    into a numpy array.  Used by the gdal.Dataset.ReadAsArray method.
+
+    If threads is greater than 1, the window is split in block aligned strips
+    read concurrently from separate handles on the same file. This is only
+    done when no resampling or progress callback is requested, and when the
+    dataset can be reopened from its description.
+
+    If cache is a TileCache, the (read-only) array is looked up in it, and
+    stored in it after being read, when neither buf_obj nor callback are
+    specified."""
+
+    if cache is not None and buf_obj is None and callback is None:
+        key = cache.Key(ds, xoff, yoff, win_xsize, win_ysize, buf_xsize, buf_ysize,
+                        buf_type, resample_alg, band_list, interleave)
+        if key is not None:
+            return cache.GetOrCompute(key, lambda: DatasetReadAsArray(
+                ds, xoff, yoff, win_xsize, win_ysize, None, buf_xsize, buf_ysize, buf_type,
+                resample_alg=resample_alg, interleave=interleave, band_list=band_list,
+                threads=threads))
+
+    if win_xsize is None:
+        win_xsize = ds.RasterXSize
+    if win_ysize is None:
+        win_ysize = ds.RasterYSize
+
+    if band_list is None:
+        band_list = list(range(1, ds.RasterCount + 1))
+
+    if threads is not None and threads > 1 and band_list and callback is None and \
+       buf_xsize in (None, win_xsize) and buf_ysize in (None, win_ysize) and \
+       ds.GetDescription() and ds.GetDriver().ShortName != 'MEM':
+        return _DatasetReadAsArrayThreaded(ds, xoff, yoff, win_xsize, win_ysize, buf_obj,
+                                           buf_type, resample_alg, interleave, band_list,
+                                           threads)
+
+    interleave = interleave.lower()
+    if interleave == 'band':
+        interleave = True
+        xdim = 2
+        ydim = 1
+        banddim = 0
+    elif interleave == 'pixel':
+        interleave = False
+        xdim = 1
+        ydim = 0
+        banddim = 2
+    else:
+        raise ValueError('Interleave should be band or pixel')
+
+    nbands = len(band_list)
+    if nbands == 0:
+        return None
+
+    if nbands == 1:
+        if buf_obj is None:
+            buf_type, typecode = _DatasetBufType(ds, band_list, buf_type)
+            buf_obj = _EmptyBuffer((win_ysize if buf_ysize is None else buf_ysize,
+                                    win_xsize if buf_xsize is None else buf_xsize), typecode)
+            buf_type = None
+        return BandReadAsArray(ds.GetRasterBand(band_list[0]), xoff, yoff, win_xsize, win_ysize,
+                               buf_xsize=buf_xsize, buf_ysize=buf_ysize, buf_type=buf_type,
+                               buf_obj=buf_obj,
+                               resample_alg=resample_alg,
+                               callback=callback,
+                               callback_data=callback_data)
+
+    if buf_obj is None:
+        if buf_xsize is None:
+            buf_xsize = win_xsize
+        if buf_ysize is None:
+            buf_ysize = win_ysize
+        buf_type, typecode = _DatasetBufType(ds, band_list, buf_type)
+        buf_shape = (nbands, buf_ysize, buf_xsize) if interleave else (buf_ysize, buf_xsize, nbands)
+        buf_obj = _EmptyBuffer(buf_shape, typecode)
+
+    else:
+        if len(buf_obj.shape) != 3:
+            raise ValueError('Array should have 3 dimensions')
+
+        shape_buf_xsize = buf_obj.shape[xdim]
+        shape_buf_ysize = buf_obj.shape[ydim]
+        if buf_xsize is not None and buf_xsize != shape_buf_xsize:
+            raise ValueError('Specified buf_xsize not consistent with array shape')
+        if buf_ysize is not None and buf_ysize != shape_buf_ysize:
+            raise ValueError('Specified buf_ysize not consistent with array shape')
+        if buf_obj.shape[banddim] != nbands:
+            raise ValueError('Dimension %d of array should have size %d to store bands)' % (banddim, nbands))
+
+        datatype = NumericTypeCodeToGDALTypeCode(buf_obj.dtype.type)
+        if not datatype:
+            raise ValueError("array does not have corresponding GDAL data type")
+        if buf_type is not None and buf_type != datatype:
+            raise ValueError("Specified buf_type not consistent with array type")
+        buf_type = datatype
+
+    if DatasetIONumPy(ds, 0, xoff, yoff, win_xsize, win_ysize,
+                      buf_obj, buf_type, resample_alg, callback, callback_data,
+                      interleave, band_list) != 0:
+        _RaiseException()
+        return None
+
+    return buf_obj
+
+
+def BandReadAsArray(band, xoff=0, yoff=0, win_xsize=None, win_ysize=None,
+                    buf_xsize=None, buf_ysize=None, buf_type=None, buf_obj=None,
+                    resample_alg=gdal.GRIORA_NearestNeighbour,
+                    callback=None, callback_data=None, cache=None):
+    """Pure python implementation of reading a chunk of a GDAL file
+    into a numpy array.  Used by the gdal.Band.ReadAsArray method.
+
+    If cache is a TileCache, the (read-only) array is looked up in it, and
+    stored in it after being read, when neither buf_obj nor callback are
+    specified."""
+
+    if cache is not None and buf_obj is None and callback is None:
+        key = cache.Key(band, xoff, yoff, win_xsize, win_ysize, buf_xsize, buf_ysize,
+                        buf_type, resample_alg)
+        if key is not None:
+            return cache.GetOrCompute(key, lambda: BandReadAsArray(
+                band, xoff, yoff, win_xsize, win_ysize, buf_xsize, buf_ysize, buf_type,
+                resample_alg=resample_alg))
+
+    if win_xsize is None:
+        win_xsize = band.XSize
+    if win_ysize is None:
+        win_ysize = band.YSize
+
+    if buf_obj is None:
+        if buf_xsize is None:
+            buf_xsize = win_xsize
+        if buf_ysize is None:
+            buf_ysize = win_ysize
+        if buf_type is None:
+            buf_type = band.DataType
+
+        typecode = GDALTypeCodeToNumericTypeCode(buf_type)
+        if typecode is None:
+            buf_type = gdalconst.GDT_Float32
+            typecode = numpy.float32
+        else:
+            buf_type = NumericTypeCodeToGDALTypeCode(typecode)
+
+        if buf_type == gdalconst.GDT_Byte and band.GetMetadataItem('PIXELTYPE', 'IMAGE_STRUCTURE') == 'SIGNEDBYTE':
+            typecode = numpy.int8
+        buf_obj = _EmptyBuffer((buf_ysize, buf_xsize), typecode)
+
+    else:
+        if len(buf_obj.shape) not in (2, 3):
+            raise ValueError("expected array of dimension 2 or 3")
+
+        if len(buf_obj.shape) == 2:
+            shape_buf_xsize = buf_obj.shape[1]
+            shape_buf_ysize = buf_obj.shape[0]
+        else:
+            if buf_obj.shape[0] != 1:
+                raise ValueError("expected size of first dimension should be 0")
+            shape_buf_xsize = buf_obj.shape[2]
+            shape_buf_ysize = buf_obj.shape[1]
+        if buf_xsize is not None and buf_xsize != shape_buf_xsize:
+            raise ValueError('Specified buf_xsize not consistent with array shape')
+        if buf_ysize is not None and buf_ysize != shape_buf_ysize:
+            raise ValueError('Specified buf_ysize not consistent with array shape')
+
+        datatype = NumericTypeCodeToGDALTypeCode(buf_obj.dtype.type)
+        if not datatype:
+            raise ValueError("array does not have corresponding GDAL data type")
+        if buf_type is not None and buf_type != datatype:
+            raise ValueError("Specified buf_type not consistent with array type")
+        buf_type = datatype
+
+    if BandRasterIONumPy(band, 0, xoff, yoff, win_xsize, win_ysize,
+                         buf_obj, buf_type, resample_alg, callback, callback_data) != 0:
+        _RaiseException()
+        return None
+
+    return buf_obj
+
+def _FillMask(band, data, mask, xoff, yoff, win_xsize, win_ysize, resample_alg):
+    """Set mask to True where data, read from band, is invalid according to
+    the mask flags of band. Return False, leaving mask untouched, if all
+    pixels are valid, and None if the mask band could not be read."""
+
+    flags = band.GetMaskFlags()
+    if flags & gdalconst.GMF_ALL_VALID:
+        return False
+
+    if flags == gdalconst.GMF_NODATA:
+        nodata = band.GetNoDataValue()
+        if nodata is None:
+            return False
+        if nodata != nodata:
+            if data.dtype.kind not in 'fc':
+                return False
+            numpy.isnan(data, out=mask)
+        else:
+            numpy.equal(data, nodata, out=mask)
+        return True
+
+    mask_buf = BandReadAsArray(band.GetMaskBand(), xoff, yoff, win_xsize, win_ysize,
+                               buf_xsize=mask.shape[-1], buf_ysize=mask.shape[-2],
+                               buf_type=gdalconst.GDT_Byte, resample_alg=resample_alg)
+    if mask_buf is None:
+        return None
+    numpy.equal(mask_buf, 0, out=mask)
+    return True
+
+def _AlphaBandIndex(ds, bands):
+    """Return the index of the alpha band of ds if it is the mask of all
+    bands, and can be read together with them, or None."""
+
+    if ds is None:
+        return None
+    alpha_index = None
+    for band in bands:
+        if band.GetMaskFlags() != gdalconst.GMF_PER_DATASET | gdalconst.GMF_ALPHA:
+            return None
+        alpha = band.GetMaskBand()
+        index = alpha.GetBand()
+        if index <= 0 or alpha_index not in (None, index):
+            return None
+        alpha_index = index
+        if alpha.DataType != band.DataType:
+            return None
+    return alpha_index
+
+def DatasetReadAsMaskedArray(ds, xoff=0, yoff=0, win_xsize=None, win_ysize=None,
+                             buf_xsize=None, buf_ysize=None, buf_type=None,
+                             resample_alg=gdal.GRIORA_NearestNeighbour,
+                             callback=None, callback_data=None, band_list=None):
+    """Read a chunk of a GDAL file into a numpy masked array, masking the
+    pixels that are invalid according to the mask band of each band.
+
+    Nodata masks are computed from the data, and an alpha band shared by
+    all requested bands is read in the same RasterIO request as them. Used
+    by the gdal.Dataset.ReadAsMaskedArray method."""
+
+    if win_xsize is None:
+        win_xsize = ds.RasterXSize
+    if win_ysize is None:
+        win_ysize = ds.RasterYSize
+    if buf_xsize is None:
+        buf_xsize = win_xsize
+    if buf_ysize is None:
+        buf_ysize = win_ysize
+    if band_list is None:
+        band_list = list(range(1, ds.RasterCount + 1))
+    if not band_list:
+        return None
+
+    bands = [ds.GetRasterBand(i) for i in band_list]
+    alpha_index = None
+    if buf_type is None:
+        alpha_index = _AlphaBandIndex(ds, bands)
+
+    if alpha_index is not None:
+        nbands = len(band_list)
+        buf_type, typecode = _DatasetBufType(ds, band_list, None)
+        buf_obj = _EmptyBuffer((nbands + 1, buf_ysize, buf_xsize), typecode)
+        if DatasetIONumPy(ds, 0, xoff, yoff, win_xsize, win_ysize,
+                          buf_obj, buf_type, resample_alg, callback, callback_data,
+                          True, list(band_list) + [alpha_index]) != 0:
+            _RaiseException()
+            return None
+        alpha_mask = buf_obj[nbands] == 0
+        if nbands == 1:
+            return numpy.ma.MaskedArray(buf_obj[0], mask=alpha_mask, copy=False)
+        mask = numpy.empty((nbands, buf_ysize, buf_xsize), dtype=bool)
+        mask[...] = alpha_mask
+        return numpy.ma.MaskedArray(buf_obj[:nbands], mask=mask, copy=False)
+
+    data = DatasetReadAsArray(ds, xoff, yoff, win_xsize, win_ysize,
+                              buf_xsize=buf_xsize, buf_ysize=buf_ysize, buf_type=buf_type,
+                              resample_alg=resample_alg, callback=callback,
+                              callback_data=callback_data, band_list=band_list)
+    if data is None:
+        return None
+
+    mask = None
+    masked = False
+    dataset_mask = None
+    for i, band in enumerate(bands):
+        flags = band.GetMaskFlags()
+        if flags & gdalconst.GMF_ALL_VALID:
+            continue
+        if mask is None:
+            mask = numpy.zeros(data.shape, dtype=bool)
+        band_data = data if len(data.shape) == 2 else data[i]
+        band_mask = mask if len(mask.shape) == 2 else mask[i]
+
+        if flags & gdalconst.GMF_PER_DATASET:
+            # Shared by all bands: computed once, from the data when it is
+            # a requested alpha band
+            if dataset_mask is None:
+                mask_index = band.GetMaskBand().GetBand() if flags & gdalconst.GMF_ALPHA else 0
+                if mask_index in band_list:
+                    j = band_list.index(mask_index)
+                    dataset_mask = (data if len(data.shape) == 2 else data[j]) == 0
+                else:
+                    dataset_mask = numpy.zeros(band_mask.shape, dtype=bool)
+                    if _FillMask(band, band_data, dataset_mask, xoff, yoff,
+                                 win_xsize, win_ysize, resample_alg) is None:
+                        _RaiseException()
+                        return None
+            band_mask[...] = dataset_mask
+            masked = True
+            continue
+
+        ret = _FillMask(band, band_data, band_mask, xoff, yoff, win_xsize, win_ysize,
+                        resample_alg)
+        if ret is None:
+            _RaiseException()
+            return None
+        masked = masked or ret
+
+    return numpy.ma.MaskedArray(data, mask=mask if masked else numpy.ma.nomask, copy=False)
+
+def BandReadAsMaskedArray(band, xoff=0, yoff=0, win_xsize=None, win_ysize=None,
+                          buf_xsize=None, buf_ysize=None, buf_type=None,
+                          resample_alg=gdal.GRIORA_NearestNeighbour,
+                          callback=None, callback_data=None):
+    """Read a chunk of a GDAL band into a numpy masked array, masking the
+    pixels that are invalid according to the mask band.
+
+    Nodata masks are computed from the data, and an alpha band is read in
+    the same RasterIO request as the band. Used by the
+    gdal.Band.ReadAsMaskedArray method."""
+
+    if win_xsize is None:
+        win_xsize = band.XSize
+    if win_ysize is None:
+        win_ysize = band.YSize
+
+    ds = band.GetDataset()
+    if ds is not None and band.GetBand() > 0 and buf_type is None and \
+       _AlphaBandIndex(ds, [band]) is not None:
+        return DatasetReadAsMaskedArray(ds, xoff, yoff, win_xsize, win_ysize,
+                                        buf_xsize, buf_ysize,
+                                        resample_alg=resample_alg, callback=callback,
+                                        callback_data=callback_data,
+                                        band_list=[band.GetBand()])
+
+    data = BandReadAsArray(band, xoff, yoff, win_xsize, win_ysize,
+                           buf_xsize=buf_xsize, buf_ysize=buf_ysize, buf_type=buf_type,
+                           resample_alg=resample_alg, callback=callback,
+                           callback_data=callback_data)
+    if data is None:
+        return None
+
+    if band.GetMaskFlags() & gdalconst.GMF_ALL_VALID:
+        return numpy.ma.MaskedArray(data, mask=numpy.ma.nomask, copy=False)
+    mask = numpy.zeros(data.shape, dtype=bool)
+    ret = _FillMask(band, data, mask, xoff, yoff, win_xsize, win_ysize, resample_alg)
+    if ret is None:
+        _RaiseException()
+        return None
+    return numpy.ma.MaskedArray(data, mask=mask if ret else numpy.ma.nomask, copy=False)
+
+
+def _BlockWindows(xsize, ysize, block_xsize, block_ysize):
+    """Yield the (xoff, yoff, win_xsize, win_ysize) windows of the block grid
+    of a raster, row of blocks by row of blocks."""
+    for yoff in range(0, ysize, block_ysize):
+        win_ysize = min(block_ysize, ysize - yoff)
+        for xoff in range(0, xsize, block_xsize):
+            yield xoff, yoff, min(block_xsize, xsize - xoff), win_ysize
+
+def BandIterBlocks(band, buf_type=None, buf_obj=None):
+    """Iterate over the native blocks of a band, yielding (xoff, yoff, array)
+    tuples. Used by the gdal.Band.IterBlocks method.
+
+    A single buffer of the size of a block is allocated (or buf_obj is used)
+    and reused for every block: the yielded arrays are views on it, which
+    are only valid until the next iteration."""
+
+    block_xsize, block_ysize = band.GetBlockSize()
+    for xoff, yoff, win_xsize, win_ysize in _BlockWindows(band.XSize, band.YSize,
+                                                          block_xsize, block_ysize):
+        if buf_obj is None:
+            array = BandReadAsArray(band, xoff, yoff, win_xsize, win_ysize,
+                                    buf_type=buf_type)
+            buf_obj = array
+        else:
+            view = buf_obj[..., :win_ysize, :win_xsize]
+            array = BandReadAsArray(band, xoff, yoff, win_xsize, win_ysize,
+                                    buf_type=buf_type, buf_obj=view)
+        if array is None:
+            return
+        yield xoff, yoff, array
+
+def DatasetIterBlocks(ds, buf_type=None, buf_obj=None, interleave='band',
+                      band_list=None):
+    """Iterate over the native blocks of a dataset, yielding (xoff, yoff, array)
+    tuples. The block grid is the one of the first band of band_list. Used by
+    the gdal.Dataset.IterBlocks method.
+
+    A single buffer of the size of a block is allocated (or buf_obj is used)
+    and reused for every block: the yielded arrays are views on it, which
+    are only valid until the next iteration."""
+
+    if band_list is None:
+        band_list = list(range(1, ds.RasterCount + 1))
+    if not band_list:
+        return
+
+    pixel_interleave = interleave.lower() == 'pixel'
+    block_xsize, block_ysize = ds.GetRasterBand(band_list[0]).GetBlockSize()
+    for xoff, yoff, win_xsize, win_ysize in _BlockWindows(ds.RasterXSize, ds.RasterYSize,
+                                                          block_xsize, block_ysize):
+        if buf_obj is None:
+            array = DatasetReadAsArray(ds, xoff, yoff, win_xsize, win_ysize,
+                                       buf_type=buf_type, interleave=interleave,
+                                       band_list=band_list)
+            buf_obj = array
+        else:
+            if len(buf_obj.shape) == 3 and pixel_interleave:
+                view = buf_obj[:win_ysize, :win_xsize, :]
+            else:
+                view = buf_obj[..., :win_ysize, :win_xsize]
+            array = DatasetReadAsArray(ds, xoff, yoff, win_xsize, win_ysize,
+                                       buf_obj=view, buf_type=buf_type,
+                                       interleave=interleave, band_list=band_list)
+        if array is None:
+            return
+        yield xoff, yoff, array
+
+def DatasetSamplePoints(ds, xs, ys, band_list=None, overview=None, fill_value=0):
+    """
+    Return the values of the pixels of ds containing the points of
+    georeferenced coordinates (xs, ys), as an array of shape
+    (len(xs), len(band_list)).
+
+    Points are grouped by block, and the part of each block covering its
+    points is read in a single request. If overview is not None, values are
+    read from that overview level of each band. Points outside of the
+    raster get fill_value, the type of the output being promoted if needed
+    to represent it.
+    """
+
+    if band_list is None:
+        band_list = list(range(1, ds.RasterCount + 1))
+    if not band_list:
+        raise ValueError("band_list should not be empty")
+
+    xs = numpy.asarray(xs, dtype=numpy.float64).ravel()
+    ys = numpy.asarray(ys, dtype=numpy.float64).ravel()
+    if xs.shape != ys.shape:
+        raise ValueError("xs and ys should have the same size")
+    pixels, lines = gdal.GeoTransform.FromDataset(ds).GeoToPixel(xs, ys)
+
+    if overview is None:
+        bands = None
+        xsize, ysize = ds.RasterXSize, ds.RasterYSize
+        block_xsize, block_ysize = ds.GetRasterBand(band_list[0]).GetBlockSize()
+    else:
+        bands = [ds.GetRasterBand(i).GetOverview(overview) for i in band_list]
+        if any(band is None for band in bands):
+            raise ValueError("overview %d does not exist for all bands" % overview)
+        xsize, ysize = bands[0].XSize, bands[0].YSize
+        pixels = pixels * (xsize / ds.RasterXSize)
+        lines = lines * (ysize / ds.RasterYSize)
+        block_xsize, block_ysize = bands[0].GetBlockSize()
+
+    buf_type, typecode = _DatasetBufType(ds, band_list, None)
+    fill_type = numpy.min_scalar_type(fill_value)
+    if fill_type.kind == 'f':
+        # not float16, which min_scalar_type() gives for nan
+        fill_type = numpy.promote_types(fill_type, numpy.float32)
+    dtype = numpy.result_type(typecode, fill_type)
+    out = numpy.full((len(xs), len(band_list)), fill_value, dtype=dtype)
+
+    valid = (pixels >= 0) & (pixels < xsize) & (lines >= 0) & (lines < ysize)
+    indices = numpy.flatnonzero(valid)
+    if not len(indices):
+        return out
+    cols = pixels[indices].astype(numpy.int64)
+    rows = lines[indices].astype(numpy.int64)
+
+    nblocks_x = (xsize + block_xsize - 1) // block_xsize
+    block_ids = (rows // block_ysize) * nblocks_x + cols // block_xsize
+    order = numpy.argsort(block_ids, kind='stable')
+    indices, cols, rows, block_ids = indices[order], cols[order], rows[order], block_ids[order]
+    starts = numpy.flatnonzero(numpy.diff(block_ids)) + 1
+    for start, end in zip([0] + list(starts), list(starts) + [len(indices)]):
+        block_cols = cols[start:end]
+        block_rows = rows[start:end]
+        xoff, yoff = int(block_cols.min()), int(block_rows.min())
+        win_xsize = int(block_cols.max()) - xoff + 1
+        win_ysize = int(block_rows.max()) - yoff + 1
+        if bands is None:
+            window = DatasetReadAsArray(ds, xoff, yoff, win_xsize, win_ysize,
+                                        buf_type=buf_type, band_list=band_list)
+            if window is None:
+                return None
+            if len(window.shape) == 2:
+                window = window[numpy.newaxis]
+        else:
+            window = _EmptyBuffer((len(bands), win_ysize, win_xsize), typecode)
+            for i, band in enumerate(bands):
+                if BandReadAsArray(band, xoff, yoff, win_xsize, win_ysize,
+                                   buf_obj=window[i]) is None:
+                    return None
+        out[indices[start:end]] = window[:, block_rows - yoff, block_cols - xoff].T
+
+    return out
+
+class _ZonalAccumulator(object):
+    """Per zone and band accumulators of ZonalStatistics(), indexed by the
+    order in which zones are first seen."""
+
+    def __init__(self, nbands, histogram):
+        self.nbands = nbands
+        self.histogram = histogram
+        self.zone_ids = []
+        self._zone_indices = {}
+        self.count = numpy.zeros((0, nbands), dtype=numpy.int64)
+        self.sum = numpy.zeros((0, nbands))
+        # running means and sums of squared deviations from them, merged
+        # with Chan's formula not to lose precision on large values
+        self.mean = numpy.zeros((0, nbands))
+        self.m2 = numpy.zeros((0, nbands))
+        self.min = numpy.zeros((0, nbands))
+        self.max = numpy.zeros((0, nbands))
+        if histogram is not None:
+            self.hist = numpy.zeros((0, nbands, histogram[0]), dtype=numpy.int64)
+
+    def _Indices(self, zone_ids):
+        indices = numpy.empty(len(zone_ids), dtype=numpy.int64)
+        for i, zone_id in enumerate(zone_ids.tolist()):
+            index = self._zone_indices.get(zone_id)
+            if index is None:
+                index = self._zone_indices[zone_id] = len(self.zone_ids)
+                self.zone_ids.append(zone_id)
+            indices[i] = index
+        nzones = len(self.zone_ids)
+        if nzones > len(self.count):
+            capacity = max(nzones, 2 * len(self.count))
+            grow = capacity - len(self.count)
+            self.count = numpy.concatenate([self.count, numpy.zeros((grow, self.nbands), numpy.int64)])
+            self.sum = numpy.concatenate([self.sum, numpy.zeros((grow, self.nbands))])
+            self.mean = numpy.concatenate([self.mean, numpy.zeros((grow, self.nbands))])
+            self.m2 = numpy.concatenate([self.m2, numpy.zeros((grow, self.nbands))])
+            self.min = numpy.concatenate([self.min, numpy.full((grow, self.nbands), numpy.inf)])
+            self.max = numpy.concatenate([self.max, numpy.full((grow, self.nbands), -numpy.inf)])
+            if self.histogram is not None:
+                self.hist = numpy.concatenate([self.hist, numpy.zeros(
+                    (grow, self.nbands, self.histogram[0]), numpy.int64)])
+        return indices
+
+    def Add(self, band, zones, values):
+        """Accumulate values of band (0-based) for the zone ids in zones,
+        both 1D arrays of valid pixels."""
+
+        if not len(zones):
+            return
+        order = numpy.argsort(zones, kind='stable')
+        zones = zones[order]
+        values = values[order]
+        starts = numpy.concatenate([[0], numpy.flatnonzero(numpy.diff(zones)) + 1])
+        counts = numpy.diff(numpy.concatenate([starts, [len(zones)]]))
+        indices = self._Indices(zones[starts])
+
+        sums = numpy.add.reduceat(values, starts)
+        means = sums / counts
+        deviations = values - numpy.repeat(means, counts)
+        m2s = numpy.add.reduceat(deviations * deviations, starts)
+        previous_counts = self.count[indices, band]
+        total_counts = previous_counts + counts
+        delta = means - self.mean[indices, band]
+        self.mean[indices, band] += delta * (counts / total_counts)
+        self.m2[indices, band] += m2s + delta * delta * (previous_counts * (counts / total_counts))
+        self.count[indices, band] = total_counts
+        self.sum[indices, band] += sums
+        self.min[indices, band] = numpy.minimum(self.min[indices, band],
+                                                numpy.minimum.reduceat(values, starts))
+        self.max[indices, band] = numpy.maximum(self.max[indices, band],
+                                                numpy.maximum.reduceat(values, starts))
+        if self.histogram is not None:
+            bins, hist_min, hist_max = self.histogram
+            in_range = (values >= hist_min) & (values <= hist_max)
+            bin_indices = ((values[in_range] - hist_min) * (bins / (hist_max - hist_min))).astype(numpy.int64)
+            numpy.minimum(bin_indices, bins - 1, out=bin_indices)
+            segments = numpy.repeat(numpy.arange(len(starts)), counts)[in_range]
+            hist = numpy.bincount(segments * bins + bin_indices, minlength=len(starts) * bins)
+            self.hist[indices, band] += hist.reshape(len(starts), bins)
+
+    def Result(self, stats):
+        nzones = len(self.zone_ids)
+        zone_ids = numpy.array(self.zone_ids)
+        if zone_ids.dtype.kind == 'f' and numpy.all(zone_ids == numpy.floor(zone_ids)):
+            zone_ids = zone_ids.astype(numpy.int64)
+        count = self.count[:nzones]
+        empty = count == 0
+        mean = numpy.where(empty, numpy.nan, self.mean[:nzones])
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            variance = self.m2[:nzones] / count
+        result = {'zone': zone_ids}
+        for stat in stats:
+            if stat == 'count':
+                result[stat] = count
+            elif stat == 'sum':
+                result[stat] = self.sum[:nzones]
+            elif stat == 'mean':
+                result[stat] = mean
+            elif stat == 'std':
+                result[stat] = numpy.sqrt(variance)
+            elif stat in ('min', 'max'):
+                array = getattr(self, stat)[:nzones]
+                array[empty] = numpy.nan
+                result[stat] = array
+            elif stat == 'histogram':
+                result[stat] = self.hist[:nzones]
+        return result
+
+_ZONAL_STATS = ('count', 'sum', 'mean', 'std', 'min', 'max', 'histogram')
+
+def ZonalStatistics(ds, zones_layer, stats=('count', 'sum', 'mean', 'min', 'max'),
+                    band_list=None, zone_field=None, workers=1, histogram=None,
+                    all_touched=False, chunk_size=None, callback=None, callback_data=None):
+    """
+    Compute statistics of the pixel values of ds within the zones defined
+    by the features of zones_layer, an OGR layer in the coordinate system
+    of ds. Used by gdal.ZonalStatistics().
+
+    Zones are identified by the values of the integer or real zone_field,
+    or by feature ids if zone_field is None (the features of each window
+    are then copied in memory with their ids as attribute). Integer zones
+    are rasterized as Int64, real ones as Float64. A pixel covered by
+    several zones is only counted in the zone rasterized last, i.e. the
+    last of the overlapping features in the layer order. The raster is
+    processed by windows of chunk_size (xsize, ysize) pixels, by default
+    block aligned and about 1024x1024. In each window, the zones are rasterized with
+    RasterizeLayer() in memory, and the values of the zones are
+    accumulated. Pixels equal to the nodata value of their band, or NaN,
+    are ignored. With workers > 1, values of upcoming windows are read
+    concurrently by that many threads while zones are rasterized, each
+    thread using its own handle on the file of ds when it can be reopened
+    (see MapBlocks()).
+
+    stats is a list among 'count', 'sum', 'mean', 'std', 'min', 'max' and
+    'histogram', the latter requiring histogram=(bins, min, max). The
+    result is a dict with a 'zone' array of the zone ids, and an array of
+    shape (zones, bands), or (zones, bands, bins) for histograms, per
+    statistic.
+
+    Only the features selected by the attribute and spatial filters of
+    zones_layer are used. The spatial filter is modified during the
+    computation and restored afterwards. None is returned if the computation fails or
+    is interrupted by callback.
+    """
+
+    from concurrent.futures import ThreadPoolExecutor
+    from osgeo import ogr
+
+    for stat in stats:
+        if stat not in _ZONAL_STATS:
+            raise ValueError("Unknown statistic: %s" % stat)
+    if 'histogram' in stats and histogram is None:
+        raise ValueError("histogram=(bins, min, max) must be specified")
+    if histogram is not None and histogram[2] <= histogram[1]:
+        raise ValueError("histogram max must be greater than min")
+    if band_list is None:
+        band_list = list(range(1, ds.RasterCount + 1))
+    if not band_list:
+        raise ValueError("band_list should not be empty")
+
+    layer = zones_layer
+    by_fid = zone_field is None
+    if by_fid:
+        zone_field = 'zone_fid'
+        integer_zones = True
+    else:
+        defn = layer.GetLayerDefn()
+        index = defn.GetFieldIndex(zone_field)
+        if index < 0:
+            raise ValueError("No field named %s in zones_layer" % zone_field)
+        integer_zones = defn.GetFieldDefn(index).GetType() in (ogr.OFTInteger, ogr.OFTInteger64)
+    # integer zones are burned as Int64 so that ids above 2**53 stay distinct
+    if integer_zones:
+        zone_type, no_zone = gdalconst.GDT_Int64, numpy.iinfo(numpy.int64).min
+    else:
+        zone_type, no_zone = gdalconst.GDT_Float64, numpy.nan
+
+    def fid_layer():
+        # RasterizeLayer() can't burn feature ids: copy the features of the
+        # window in memory with their id as attribute
+        mem_ds = ogr.GetDriverByName('Memory').CreateDataSource('')
+        mem_layer = mem_ds.CreateLayer('zones', layer.GetSpatialRef(), layer.GetGeomType())
+        mem_layer.CreateField(ogr.FieldDefn(zone_field, ogr.OFTInteger64))
+        defn = mem_layer.GetLayerDefn()
+        layer.ResetReading()
+        for src_feature in layer:
+            feature = ogr.Feature(defn)
+            feature.SetGeometry(src_feature.GetGeometryRef())
+            feature.SetField(zone_field, src_feature.GetFID())
+            mem_layer.CreateFeature(feature)
+        return mem_ds, mem_layer
+
+    xsize, ysize = ds.RasterXSize, ds.RasterYSize
+    if chunk_size is None:
+        block_xsize, block_ysize = ds.GetRasterBand(band_list[0]).GetBlockSize()
+        chunk_size = (block_xsize * max(1, 1024 // block_xsize),
+                      block_ysize * max(1, 1024 // block_ysize))
+    windows = _BlockWindows(xsize, ysize, min(chunk_size[0], xsize), min(chunk_size[1], ysize))
+
+    gt = gdal.GeoTransform.FromDataset(ds)
+    projection = ds.GetProjectionRef()
+    nodata = [ds.GetRasterBand(i).GetNoDataValue() for i in band_list]
+    rasterize_options = ['ATTRIBUTE=' + zone_field]
+    if all_touched:
+        rasterize_options.append('ALL_TOUCHED=TRUE')
+
+    reopen_info = _ReopenInfo(ds) if workers > 1 else None
+    handles = threading.local()
+    read_lock = threading.Lock()
+
+    def read(window):
+        if not hasattr(handles, 'ds'):
+            handles.ds = _Reopen(reopen_info) if reopen_info is not None else None
+        src = handles.ds
+        if src is None:
+            with read_lock:
+                array = DatasetReadAsArray(ds, *window, buf_type=gdalconst.GDT_Float64,
+                                           band_list=band_list)
+        else:
+            array = DatasetReadAsArray(src, *window, buf_type=gdalconst.GDT_Float64,
+                                       band_list=band_list)
+        if array is not None and len(array.shape) == 2:
+            array = array[numpy.newaxis]
+        return array
+
+    zone_datasets = {}
+    mem_driver = gdal.GetDriverByName('MEM')
+
+    def rasterize(window):
+        xoff, yoff, win_xsize, win_ysize = window
+        minx, miny, maxx, maxy = gt.BoundsFromWindow(*window)
+        if spatial_filter is None:
+            layer.SetSpatialFilterRect(minx, miny, maxx, maxy)
+        else:
+            # Restrict the spatial filter of the caller to the window
+            rect = ogr.CreateGeometryFromWkt(
+                'POLYGON ((%.17g %.17g,%.17g %.17g,%.17g %.17g,%.17g %.17g,%.17g %.17g))' %
+                (minx, miny, maxx, miny, maxx, maxy, minx, maxy, minx, miny))
+            window_filter = spatial_filter.Intersection(rect)
+            if window_filter is None or window_filter.IsEmpty():
+                return numpy.full((win_ysize, win_xsize), no_zone,
+                                  dtype=flip_code(zone_type))
+            layer.SetSpatialFilter(window_filter)
+
+        zone_ds = zone_datasets.get((win_xsize, win_ysize))
+        if zone_ds is None:
+            zone_ds = mem_driver.Create('', win_xsize, win_ysize, 1, zone_type)
+            zone_ds.SetProjection(projection)
+            zone_datasets[(win_xsize, win_ysize)] = zone_ds
+        zone_ds.SetGeoTransform(tuple(gt.Shift(xoff, yoff)))
+        zone_ds.GetRasterBand(1).Fill(float(no_zone))
+        burn_ds, burn_layer = fid_layer() if by_fid else (None, layer)
+        if gdal.RasterizeLayer(zone_ds, [1], burn_layer, options=rasterize_options) != 0:
+            return None
+        return BandReadAsArray(zone_ds.GetRasterBand(1))
+
+    accumulator = _ZonalAccumulator(len(band_list), histogram)
+    spatial_filter = layer.GetSpatialFilter()
+    if spatial_filter is not None:
+        spatial_filter = spatial_filter.Clone()
+    executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        pending = collections.deque()
+        windows = iter(windows)
+        nwindows = ((xsize + chunk_size[0] - 1) // chunk_size[0]) * \
+                   ((ysize + chunk_size[1] - 1) // chunk_size[1])
+        done = 0
+        while True:
+            while executor is not None and len(pending) < 2 * workers:
+                window = next(windows, None)
+                if window is None:
+                    break
+                pending.append((window, executor.submit(read, window)))
+            if pending:
+                window, future = pending.popleft()
+            else:
+                window = next(windows, None)
+                if window is None:
+                    break
+                future = None
+
+            zones = rasterize(window)
+            values = read(window) if future is None else future.result()
+            if zones is None or values is None:
+                _RaiseException()
+                return None
+
+            zones = zones.ravel()
+            has_zone = zones != no_zone if integer_zones else ~numpy.isnan(zones)
+            if has_zone.any():
+                for i in range(len(band_list)):
+                    band_values = values[i].ravel()
+                    valid = has_zone & ~numpy.isnan(band_values)
+                    if nodata[i] is not None:
+                        valid &= band_values != nodata[i]
+                    accumulator.Add(i, zones[valid], band_values[valid])
+
+            done += 1
+            if callback is not None and not callback(done / nwindows, '', callback_data):
+                return None
+    finally:
+        if executor is not None:
+            for _, future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+        layer.SetSpatialFilter(spatial_filter)
+
+    return accumulator.Result(stats)
+
+def _ReadWithHalo(src, xoff, yoff, win_xsize, win_ysize, halo):
+    """Read a window of src (a Band or a Dataset) extended by halo pixels on
+    each side. The parts of the halo outside of the raster are filled by
+    replicating the edge pixels."""
+
+    if isinstance(src, gdal.Band):
+        xsize, ysize = src.XSize, src.YSize
+    else:
+        xsize, ysize = src.RasterXSize, src.RasterYSize
+    x0 = max(0, xoff - halo)
+    y0 = max(0, yoff - halo)
+    x1 = min(xsize, xoff + win_xsize + halo)
+    y1 = min(ysize, yoff + win_ysize + halo)
+    array = src.ReadAsArray(x0, y0, x1 - x0, y1 - y0)
+    if array is None:
+        _RaiseException()
+        raise RuntimeError("Read failed at (%d, %d)" % (xoff, yoff))
+
+    pad = ((halo - (yoff - y0), halo - (y1 - yoff - win_ysize)),
+           (halo - (xoff - x0), halo - (x1 - xoff - win_xsize)))
+    if any(before or after for before, after in pad):
+        array = numpy.pad(array, ((0, 0),) * (len(array.shape) - 2) + pad, mode='edge')
+    return array
+
+def MapBlocks(func, inputs, output, halo=0, workers=1):
+    """
+    Apply func block by block to aligned rasters and write the results to
+    output.
+
+    inputs is a list of Band or Dataset objects of the same size as output
+    (a Band or a Dataset), which is processed following its block grid. For
+    each block, func is called with one array per input, covering the block
+    extended by halo pixels on each side (edge pixels are replicated beyond
+    the raster borders). func returns the array to write, of the size of
+    the block, or of the size of the extended input arrays in which case the
+    halo is cropped.
+
+    With workers > 1, blocks are read and processed concurrently by that
+    many threads, each reading through its own handles on the input files
+    when they can be reopened (their pending writes are flushed first), or
+    through the input objects in turn otherwise. Writes are done in block
+    order from the calling thread.
+    """
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    if isinstance(output, gdal.Band):
+        xsize, ysize = output.XSize, output.YSize
+        block_xsize, block_ysize = output.GetBlockSize()
+    else:
+        xsize, ysize = output.RasterXSize, output.RasterYSize
+        block_xsize, block_ysize = output.GetRasterBand(1).GetBlockSize()
+    for src in inputs:
+        if isinstance(src, gdal.Band):
+            src_size = (src.XSize, src.YSize)
+        else:
+            src_size = (src.RasterXSize, src.RasterYSize)
+        if src_size != (xsize, ysize):
+            raise ValueError("inputs and output should have the same size")
+
+    locks = [threading.Lock() for _ in inputs]
+    reopen_infos = [None] * len(inputs)
+    if workers > 1:
+        for i, src in enumerate(inputs):
+            if isinstance(src, gdal.Band):
+                reopen_infos[i] = _ReopenInfo(src.GetDataset()) if src.GetBand() > 0 else None
+            else:
+                reopen_infos[i] = _ReopenInfo(src)
+    handles = threading.local()
+
+    def thread_source(i):
+        src = inputs[i]
+        if reopen_infos[i] is None:
+            return src, locks[i]
+        if not hasattr(handles, 'sources'):
+            handles.sources = {}
+        if i not in handles.sources:
+            thread_ds = _Reopen(reopen_infos[i])
+            if thread_ds is not None and isinstance(src, gdal.Band):
+                thread_ds = thread_ds.GetRasterBand(src.GetBand())
+            handles.sources[i] = thread_ds
+        if handles.sources[i] is None:
+            return src, locks[i]
+        return handles.sources[i], None
+
+    def process(window):
+        xoff, yoff, win_xsize, win_ysize = window
+        arrays = []
+        for i in range(len(inputs)):
+            src, lock = thread_source(i)
+            if lock is None:
+                arrays.append(_ReadWithHalo(src, xoff, yoff, win_xsize, win_ysize, halo))
+            else:
+                with lock:
+                    arrays.append(_ReadWithHalo(src, xoff, yoff, win_xsize, win_ysize, halo))
+        result = numpy.asarray(func(*arrays))
+        if halo and result.shape[-2:] == (win_ysize + 2 * halo, win_xsize + 2 * halo):
+            result = result[..., halo:halo + win_ysize, halo:halo + win_xsize]
+        return result
+
+    def write(window, result):
+        if isinstance(output, gdal.Band):
+            return BandWriteArray(output, result, window[0], window[1])
+        return DatasetWriteArray(output, result, window[0], window[1])
+
+    windows = _BlockWindows(xsize, ysize, block_xsize, block_ysize)
+    if workers <= 1:
+        for window in windows:
+            ret = write(window, process(window))
+            if ret != 0:
+                return ret
+        return 0
+
+    pending = collections.deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for window in windows:
+            pending.append((window, executor.submit(process, window)))
+            if len(pending) >= 2 * workers:
+                window, future = pending.popleft()
+                ret = write(window, future.result())
+                if ret != 0:
+                    return ret
+        while pending:
+            window, future = pending.popleft()
+            ret = write(window, future.result())
+            if ret != 0:
+                return ret
+    return 0
+
+class _ChunkAccumulator(object):
+    """Accumulate hyperslabs of an N-dimensional array of the given shape
+    into chunks of chunk_shape, calling write_chunk(chunk_offset, array) as
+    soon as a chunk is fully covered. Partial chunks are completed with the
+    data returned by read_chunk(chunk_offset, chunk_shape) and written when
+    the buffered data would exceed max_bytes, or on Flush(). Chunks that
+    can't be buffered within max_bytes are not accumulated: the parts of
+    them covered by each hyperslab are written directly.
+
+    write_chunk returns 0 on success, and read_chunk None on failure."""
+
+    def __init__(self, shape, chunk_shape, write_chunk, read_chunk, max_bytes):
+        self.shape = tuple(shape)
+        self.chunk_shape = tuple(chunk_shape)
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._write_chunk = write_chunk
+        self._read_chunk = read_chunk
+        # chunk index -> [buffer, coverage mask, number of covered elements]
+        self._chunks = collections.OrderedDict()
+
+    def _ChunkGeometry(self, index):
+        start = tuple(i * c for i, c in zip(index, self.chunk_shape))
+        count = tuple(min(c, n - o) for c, n, o in zip(self.chunk_shape, self.shape, start))
+        return start, count
+
+    def Add(self, array, offset):
+        """Add array at offset, and return the first non-zero write_chunk()
+        return code, or 0."""
+
+        if len(array.shape) != len(self.shape):
+            raise ValueError("expected array of dim %d" % len(self.shape))
+        if any(o < 0 or o + n > size for o, n, size in zip(offset, array.shape, self.shape)):
+            raise ValueError("array larger than output, or offset off edge")
+        if not array.size:
+            return 0
+
+        ret = 0
+        ranges = [range(o // c, (o + n - 1) // c + 1)
+                  for o, n, c in zip(offset, array.shape, self.chunk_shape)]
+        for index in itertools.product(*ranges):
+            start, count = self._ChunkGeometry(index)
+            lo = [max(o, s) for o, s in zip(offset, start)]
+            hi = [min(o + n, s + c) for o, n, s, c in zip(offset, array.shape, start, count)]
+            src = array[tuple(slice(l - o, h - o) for l, h, o in zip(lo, hi, offset))]
+            dst = tuple(slice(l - s, h - s) for l, h, s in zip(lo, hi, start))
+
+            entry = self._chunks.get(index)
+            if entry is None:
+                if src.shape == count:
+                    ret = ret or self._write_chunk(start, src)
+                    continue
+                # buffer and coverage mask
+                chunk_nbytes = int(numpy.prod(count)) * (array.dtype.itemsize + 1)
+                if chunk_nbytes > self.max_bytes:
+                    ret = ret or self._write_chunk(tuple(lo), src)
+                    continue
+                while self._chunks and self.nbytes + chunk_nbytes > self.max_bytes:
+                    ret = ret or self._Complete(*self._chunks.popitem(last=False))
+                entry = [numpy.empty(count, dtype=array.dtype),
+                         numpy.zeros(count, dtype=bool), 0]
+                self._chunks[index] = entry
+                self.nbytes += entry[0].nbytes + entry[1].nbytes
+            else:
+                self._chunks.move_to_end(index)
+                dtype = numpy.result_type(entry[0].dtype, array.dtype)
+                if dtype != entry[0].dtype:
+                    self.nbytes -= entry[0].nbytes
+                    entry[0] = entry[0].astype(dtype)
+                    self.nbytes += entry[0].nbytes
+
+            buf, covered = entry[0], entry[1]
+            buf[dst] = src
+            entry[2] += src.size - numpy.count_nonzero(covered[dst])
+            covered[dst] = True
+            if entry[2] == buf.size:
+                del self._chunks[index]
+                self.nbytes -= buf.nbytes + covered.nbytes
+                ret = ret or self._write_chunk(start, buf)
+
+        while self.nbytes > self.max_bytes and self._chunks:
+            ret = ret or self._Complete(*self._chunks.popitem(last=False))
+        return ret
+
+    def _Complete(self, index, entry):
+        buf, covered = entry[0], entry[1]
+        self.nbytes -= buf.nbytes + covered.nbytes
+        start, count = self._ChunkGeometry(index)
+        existing = self._read_chunk(start, count)
+        if existing is None:
+            return gdalconst.CE_Failure
+        merged = numpy.empty(count, dtype=numpy.result_type(buf.dtype, existing.dtype))
+        merged[...] = existing
+        numpy.copyto(merged, buf, where=covered)
+        return self._write_chunk(start, merged)
+
+    def Flush(self):
+        """Write all partial chunks in chunk order, and return the first
+        non-zero write_chunk() return code, or 0."""
+
+        ret = 0
+        for index in sorted(self._chunks):
+            ret = ret or self._Complete(index, self._chunks[index])
+        self._chunks.clear()
+        self.nbytes = 0
+        return ret
+
+class StreamWriter(object):
+    """
+    Writer of arbitrary windows of a Band, or of the bands of a Dataset,
+    that coalesces them into whole blocks before writing them.
+
+    Windows can be written in any order with Write(). Blocks are written as
+    soon as they are fully covered, which avoids rewriting, and for
+    compressed formats recompressing, partially written blocks. When the
+    data buffered for partial blocks exceeds max_bytes, the oldest partial
+    blocks are completed with the existing content of the raster and
+    written. Close() (or leaving a with block) writes the remaining partial
+    blocks.
+    """
+
+    def __init__(self, ds, band_list=None, max_bytes=64 * 1024 * 1024):
+        if isinstance(ds, gdal.Band):
+            self._band = ds
+            shape = (ds.YSize, ds.XSize)
+            block_xsize, block_ysize = ds.GetBlockSize()
+            chunk_shape = (block_ysize, block_xsize)
+        else:
+            self._band = None
+            if band_list is None:
+                band_list = list(range(1, ds.RasterCount + 1))
+            if not band_list:
+                raise ValueError("band_list should not be empty")
+            shape = (len(band_list), ds.RasterYSize, ds.RasterXSize)
+            block_xsize, block_ysize = ds.GetRasterBand(band_list[0]).GetBlockSize()
+            chunk_shape = (len(band_list), block_ysize, block_xsize)
+        self._ds = ds
+        self._band_list = band_list
+        self._closed = False
+        self._chunks = _ChunkAccumulator(shape, chunk_shape, self._WriteBlock,
+                                         self._ReadBlock, max_bytes)
+
+    def _WriteBlock(self, offset, array):
+        if self._band is not None:
+            return BandWriteArray(self._band, array, offset[1], offset[0])
+        return DatasetWriteArray(self._ds, array, offset[2], offset[1],
+                                 band_list=self._band_list)
+
+    def _ReadBlock(self, offset, shape):
+        if self._band is not None:
+            return BandReadAsArray(self._band, offset[1], offset[0], shape[1], shape[0])
+        array = DatasetReadAsArray(self._ds, offset[2], offset[1], shape[2], shape[1],
+                                   band_list=self._band_list)
+        if array is not None and len(array.shape) == 2:
+            array = array[numpy.newaxis]
+        return array
+
+    @property
+    def nbytes(self):
+        """Number of bytes currently buffered for partial blocks."""
+        return self._chunks.nbytes
+
+    def Write(self, array, xoff=0, yoff=0):
+        """Write array at (xoff, yoff). For a Dataset, array has shape
+        (bands, ysize, xsize), or (ysize, xsize) if there is a single band.
+        Return 0 on success."""
+
+        if self._closed:
+            raise ValueError("StreamWriter is closed")
+        array = numpy.asarray(array)
+        if self._band is not None:
+            return self._chunks.Add(array, (yoff, xoff))
+        if len(array.shape) == 2 and len(self._band_list) == 1:
+            array = array[numpy.newaxis]
+        return self._chunks.Add(array, (0, yoff, xoff))
+
+    def Flush(self):
+        """Write all partial blocks, completed with the existing content of
+        the raster. Return 0 on success."""
+
+        return self._chunks.Flush()
+
+    def Close(self):
+        """Flush the writer, which cannot be used afterwards."""
+
+        if self._closed:
+            return 0
+        self._closed = True
+        return self._chunks.Flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.Close()
+
+class _WriteBehindQueue(object):
+    """Run write tasks in order on a dedicated thread. Submit() blocks while
+    more than max_pending_bytes are queued. Once a task raised an exception,
+    the remaining tasks are discarded, and the exception is re-raised by
+    every later call to Submit(), Wait() and Close()."""
+
+    def __init__(self, max_pending_bytes, name='gdal_array write-behind'):
+        self.max_pending_bytes = max_pending_bytes
+        self.pending_bytes = 0
+        self._tasks = collections.deque()
+        self._cond = threading.Condition()
+        self._error = None
+        self._stopping = False
+        self._thread = threading.Thread(target=self._Run, name=name, daemon=True)
+        self._thread.start()
+
+    def _Run(self):
+        while True:
+            with self._cond:
+                while not self._tasks and not self._stopping:
+                    self._cond.wait()
+                if not self._tasks:
+                    return
+                func, args, nbytes = self._tasks[0]
+            try:
+                if self._error is None:
+                    func(*args)
+            except BaseException as e:
+                self._error = e
+            with self._cond:
+                self._tasks.popleft()
+                self.pending_bytes -= nbytes
+                self._cond.notify_all()
+
+    def _RaiseError(self):
+        if self._error is not None:
+            raise self._error
+
+    def Submit(self, func, args, nbytes):
+        with self._cond:
+            if self._stopping:
+                raise ValueError("write-behind queue is closed")
+            self._RaiseError()
+            while self._tasks and self._error is None and \
+                  self.pending_bytes + nbytes > self.max_pending_bytes:
+                self._cond.wait()
+            self._RaiseError()
+            self._tasks.append((func, args, nbytes))
+            self.pending_bytes += nbytes
+            self._cond.notify_all()
+
+    def Wait(self):
+        """Wait for the queued tasks to be done, and re-raise the error of
+        the failed task if any."""
+
+        with self._cond:
+            while self._tasks:
+                self._cond.wait()
+            self._RaiseError()
+
+    def Close(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._RaiseError()
+
+class AsyncWriter(object):
+    """
+    Write-behind writer of a Band or of a Dataset.
+
+    Write() queues the array and returns immediately, the write being done,
+    including compression and I/O, by a dedicated thread. At most
+    max_pending_bytes of arrays are queued, Write() blocking until enough
+    pending writes have completed. Errors of the writer thread are raised by
+    the next call to Write() or by Close(), which waits for the pending
+    writes and calls FlushCache().
+
+    ds must not be used by other threads until the writer is closed.
+    """
+
+    def __init__(self, ds, max_pending_bytes=64 * 1024 * 1024):
+        self._ds = ds
+        self._queue = _WriteBehindQueue(max_pending_bytes)
+        self._closed = False
+
+    def _Write(self, array, xoff, yoff, kwargs):
+        if isinstance(self._ds, gdal.Band):
+            ret = BandWriteArray(self._ds, array, xoff, yoff, **kwargs)
+        else:
+            ret = DatasetWriteArray(self._ds, array, xoff, yoff, **kwargs)
+        if ret != 0:
+            raise RuntimeError("Write of array at (%d, %d) failed" % (xoff, yoff))
+
+    def Write(self, array, xoff=0, yoff=0, copy=True, **kwargs):
+        """Queue the write of array at (xoff, yoff). Other keyword arguments
+        are passed to Band.WriteArray() or Dataset.WriteArray(). Unless copy
+        is False, array is copied so the caller can reuse it."""
+
+        if self._closed:
+            raise ValueError("AsyncWriter is closed")
+        array = numpy.array(array, copy=True) if copy else numpy.asarray(array)
+        self._queue.Submit(self._Write, (array, xoff, yoff, kwargs), array.nbytes)
+
+    @property
+    def pending_bytes(self):
+        """Number of bytes of arrays waiting to be written."""
+        return self._queue.pending_bytes
+
+    def Wait(self):
+        """Wait for the pending writes to complete."""
+
+        self._queue.Wait()
+
+    def Close(self):
+        """Wait for the pending writes, stop the writer thread and flush the
+        cache of the dataset."""
+
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._queue.Close()
+        finally:
+            self._ds.FlushCache()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.Close()
+
+def _IndexRuns(indices, block_size):
+    """Split a monotonic array of indices into runs falling in the same
+    block, as a list of (start, end, block index) tuples."""
+
+    block_indices = indices // block_size
+    starts = [0] + list(numpy.flatnonzero(numpy.diff(block_indices)) + 1)
+    ends = starts[1:] + [len(indices)]
+    return [(start, end, int(block_indices[start])) for start, end in zip(starts, ends)]
+
+class LazyArray(object):
+    """
+    Read-only numpy-like array view of a Band, of shape (ysize, xsize), or
+    of the bands of a Dataset, of shape (bands, ysize, xsize).
+
+    Indexing with integers, slices (including steps) and Ellipsis reads
+    only the blocks that contain the selected pixels, and returns a numpy
+    array. Decoded blocks are kept in a LRU cache holding at most
+    cache_bytes, so that overlapping reads do not decode blocks again.
+    Converting to a numpy array with numpy.asarray() reads everything.
+    """
+
+    def __init__(self, ds, cache_bytes=64 * 1024 * 1024, band_list=None):
+        if isinstance(ds, gdal.Band):
+            self._band = ds
+            self._band_list = None
+            xsize, ysize = ds.XSize, ds.YSize
+            block_xsize, block_ysize = ds.GetBlockSize()
+            buf_type = ds.DataType
+            typecode = GDALTypeCodeToNumericTypeCode(buf_type)
+            if typecode is None:
+                buf_type = gdalconst.GDT_Float32
+                typecode = numpy.float32
+            elif buf_type == gdalconst.GDT_Byte and \
+                 ds.GetMetadataItem('PIXELTYPE', 'IMAGE_STRUCTURE') == 'SIGNEDBYTE':
+                typecode = numpy.int8
+            self.shape = (ysize, xsize)
+        else:
+            self._band = None
+            if band_list is None:
+                band_list = list(range(1, ds.RasterCount + 1))
+            if not band_list:
+                raise ValueError("band_list should not be empty")
+            self._band_list = list(band_list)
+            xsize, ysize = ds.RasterXSize, ds.RasterYSize
+            block_xsize, block_ysize = ds.GetRasterBand(band_list[0]).GetBlockSize()
+            buf_type, typecode = _DatasetBufType(ds, band_list, None)
+            self.shape = (len(band_list), ysize, xsize)
+        self._ds = ds
+        self._buf_type = buf_type
+        self.dtype = numpy.dtype(typecode)
+        self._block_size = (block_ysize, block_xsize)
+        self.cache_bytes = cache_bytes
+        self.nbytes_cached = 0
+        self.hits = 0
+        self.misses = 0
+        self._blocks = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        size = 1
+        for n in self.shape:
+            size *= n
+        return size
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __repr__(self):
+        return 'LazyArray(shape=%s, dtype=%s)' % (self.shape, self.dtype)
+
+    def _Blocks(self, bands, block_y, block_x):
+        """Return the list of 2D arrays of block (block_y, block_x) of the
+        bands at the given positions, reading the missing ones at once."""
+
+        keys = [(band, block_y, block_x) for band in bands]
+        with self._lock:
+            blocks = [self._blocks.get(key) for key in keys]
+            for key, block in zip(keys, blocks):
+                if block is not None:
+                    self._blocks.move_to_end(key)
+        missing = [i for i, block in enumerate(blocks) if block is None]
+        self.hits += len(blocks) - len(missing)
+        if not missing:
+            return blocks
+        self.misses += len(missing)
+
+        block_ysize, block_xsize = self._block_size
+        yoff = block_y * block_ysize
+        xoff = block_x * block_xsize
+        win_ysize = min(block_ysize, self.shape[-2] - yoff)
+        win_xsize = min(block_xsize, self.shape[-1] - xoff)
+        if self._band is not None:
+            array = BandReadAsArray(self._band, xoff, yoff, win_xsize, win_ysize,
+                                    buf_type=self._buf_type)
+        else:
+            array = DatasetReadAsArray(self._ds, xoff, yoff, win_xsize, win_ysize,
+                                       buf_type=self._buf_type,
+                                       band_list=[self._band_list[bands[i]] for i in missing])
+        if array is None:
+            raise RuntimeError("Read of block (%d, %d) failed" % (block_x, block_y))
+        if len(array.shape) == 2:
+            array = array[numpy.newaxis]
+
+        with self._lock:
+            for i, block in zip(missing, array):
+                blocks[i] = block
+                self._blocks[keys[i]] = block
+                self.nbytes_cached += block.nbytes
+            while self.nbytes_cached > self.cache_bytes and len(self._blocks) > 1:
+                _, block = self._blocks.popitem(last=False)
+                self.nbytes_cached -= block.nbytes
+        return blocks
+
+    def ClearCache(self):
+        """Drop all cached blocks."""
+
+        with self._lock:
+            self._blocks.clear()
+            self.nbytes_cached = 0
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        if any(k is Ellipsis for k in key):
+            i = [k is Ellipsis for k in key].index(True)
+            key = key[:i] + (slice(None),) * (self.ndim - len(key) + 1) + key[i + 1:]
+        if len(key) > self.ndim:
+            raise IndexError("too many indices for array")
+        key = key + (slice(None),) * (self.ndim - len(key))
+
+        indices = []
+        squeeze = []
+        for axis, (k, n) in enumerate(zip(key, self.shape)):
+            if isinstance(k, slice):
+                indices.append(numpy.arange(*k.indices(n)))
+            elif isinstance(k, (int, numpy.integer)):
+                if not -n <= k < n:
+                    raise IndexError("index %d is out of bounds for axis %d with size %d" % (k, axis, n))
+                indices.append(numpy.array([k % n]))
+                squeeze.append(axis)
+            else:
+                raise TypeError("only integers, slices and Ellipsis are valid indices")
+
+        if self._band is not None:
+            bands = [0]
+            y_indices, x_indices = indices
+        else:
+            bands = [int(i) for i in indices[0]]
+            y_indices, x_indices = indices[1:]
+
+        out = numpy.empty((len(bands), len(y_indices), len(x_indices)), dtype=self.dtype)
+        if out.size:
+            block_ysize, block_xsize = self._block_size
+            x_runs = _IndexRuns(x_indices, block_xsize)
+            for y_start, y_end, block_y in _IndexRuns(y_indices, block_ysize):
+                local_y = y_indices[y_start:y_end] - block_y * block_ysize
+                for x_start, x_end, block_x in x_runs:
+                    local_x = x_indices[x_start:x_end] - block_x * block_xsize
+                    blocks = self._Blocks(bands, block_y, block_x)
+                    for i, block in enumerate(blocks):
+                        out[i, y_start:y_end, x_start:x_end] = block[numpy.ix_(local_y, local_x)]
+
+        if self._band is not None:
+            out = out[0]
+        if squeeze:
+            out = out.reshape([n for axis, n in enumerate(out.shape) if axis not in squeeze])
+            if not out.shape:
+                return out[()]
+        return out
+
+    def __array__(self, dtype=None, copy=None):
+        array = self[...]
+        if dtype is not None:
+            array = array.astype(dtype, copy=False)
+        return array
+
+
+_mdarray_infos = weakref.WeakKeyDictionary()
+
+def _MDArrayInfo(mdarray):
+    """Return the (shape, typecode, buffer_datatype) of mdarray, cached
+    for the lifetime of the mdarray object."""
+
+    try:
+        return _mdarray_infos[mdarray]
+    except (KeyError, TypeError):
+        pass
+    shape = tuple(dim.GetSize() for dim in mdarray.GetDimensions())
+    typecode, buffer_datatype = _ExtendedDataTypeToNumPyDataType(mdarray.GetDataType())
+    info = (shape, typecode, buffer_datatype)
+    try:
+        _mdarray_infos[mdarray] = info
+    except TypeError:
+        pass
+    return info
+
+class _DatasetHandles(object):
+    """Idle multidimensional dataset handles, keyed by filename, each
+    handle being used by a single thread at a time. At most max_idle
+    handles are kept, the ones of the least recently used filenames being
+    closed first. The idle handles of a file are closed when its
+    modification time or size (see _FileSignature()) changes."""
+
+    def __init__(self, max_idle):
+        self.max_idle = max_idle
+        self._idle = collections.OrderedDict()
+        # filename -> signature of the file when its idle handles were opened
+        self._signatures = {}
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def _Drop(self, filename):
+        self._count -= len(self._idle.pop(filename, ()))
+        self._signatures.pop(filename, None)
+
+    def Acquire(self, filename):
+        """Return (handle, signature of the file) with an idle handle on
+        filename, or a new one (None if it can't be opened)."""
+        signature = _FileSignature(filename)
+        with self._lock:
+            if self._signatures.get(filename) != signature:
+                self._Drop(filename)
+            handles = self._idle.get(filename)
+            if handles:
+                self._count -= 1
+                ds = handles.pop()
+                if not handles:
+                    del self._idle[filename]
+                return ds, signature
+        return gdal.OpenEx(filename, gdalconst.OF_MULTIDIM_RASTER), signature
+
+    def Release(self, filename, ds, signature):
+        """Make ds, acquired on filename with signature, available again,
+        unless the file changed meanwhile."""
+        with self._lock:
+            if filename in self._signatures and self._signatures[filename] != signature:
+                return
+            self._signatures[filename] = signature
+            self._idle.setdefault(filename, []).append(ds)
+            self._idle.move_to_end(filename)
+            self._count += 1
+            while self._count > self.max_idle:
+                oldest = next(iter(self._idle))
+                handles = self._idle[oldest]
+                del handles[0]
+                self._count -= 1
+                if not handles:
+                    self._Drop(oldest)
+
+    def Clear(self, filename=None):
+        with self._lock:
+            if filename is not None:
+                self._Drop(filename)
+                return
+            self._idle.clear()
+            self._signatures.clear()
+            self._count = 0
+
+# Handles of the threaded reads of MDArrayReadAsArray()
+_mdarray_handles = _DatasetHandles(max_idle=64)
+
+def ClearMDArrayHandles(filename=None):
+    """Close the idle handles kept by the threaded reads of
+    MDArrayReadAsArray() on filename, or on all files if None. They are
+    also closed when the modification time or size of their file changes,
+    which misses rewrites done within the same second keeping the size."""
+    _mdarray_handles.Clear(filename)
+
+def _MDArrayReadThreaded(mdarray, array_start_idx, count, array_step,
+                         buffer_datatype, buf_obj, threads, filename):
+    """Read a hyperslab of mdarray into buf_obj with threads threads, each
+    one reading a part of it, split along chunk boundaries of the dimension
+    spanning the most chunks, through its own handle on filename. Handles
+    are kept in _mdarray_handles for the next reads, until filename changes
+    or ClearMDArrayHandles() is called. Return the error code of the first
+    failed read, or 0."""
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    block_size = mdarray.GetBlockSize()
+    split_dim, nchunks = None, 0
+    for d, (start, n, step) in enumerate(zip(array_start_idx, count, array_step)):
+        block = max(1, block_size[d]) if step == 1 else 1
+        d_nchunks = (start + n - 1) // block - start // block + 1 if n else 0
+        if d_nchunks > nchunks:
+            split_dim, nchunks = d, d_nchunks
+        if nchunks >= threads:
+            break
+    if split_dim is None or nchunks < 2:
+        return MDArrayIONumPy(False, mdarray, buf_obj, array_start_idx, array_step,
+                              buffer_datatype)
+
+    start, n, step = array_start_idx[split_dim], count[split_dim], array_step[split_dim]
+    if step == 1:
+        splits = _BlockAlignedSplits(start, n, block_size[split_dim], threads)
+    else:
+        nparts = min(threads, n)
+        splits = [(i * n // nparts, (i + 1) * n // nparts - i * n // nparts)
+                  for i in range(nparts)]
+
+    fullname = mdarray.GetFullName()
+    handles = threading.local()
+    acquired = []
+
+    def read(split):
+        start_rel, part_count = split
+        thread_mdarray = getattr(handles, 'mdarray', None)
+        if thread_mdarray is None:
+            ds, signature = _mdarray_handles.Acquire(filename)
+            if ds is None:
+                return gdalconst.CE_Failure
+            acquired.append((ds, signature))
+            thread_mdarray = ds.GetRootGroup().OpenMDArrayFromFullname(fullname)
+            if thread_mdarray is None:
+                return gdalconst.CE_Failure
+            handles.mdarray = thread_mdarray
+        part_start_idx = list(array_start_idx)
+        part_start_idx[split_dim] += start_rel * step
+        view = buf_obj[(slice(None),) * split_dim + (slice(start_rel, start_rel + part_count),)]
+        return MDArrayIONumPy(False, thread_mdarray, view, part_start_idx, array_step,
+                              buffer_datatype)
+
+    try:
+        with ThreadPoolExecutor(max_workers=min(threads, len(splits))) as executor:
+            rets = list(executor.map(read, splits))
+    finally:
+        for ds, signature in acquired:
+            _mdarray_handles.Release(filename, ds, signature)
+    return next((ret for ret in rets if ret != 0), 0)
+
+def MDArrayReadAsArray(mdarray,
+                        array_start_idx = None,
+                        count = None,
+                        array_step = None,
+                        buffer_datatype = None,
+                        buf_obj = None,
+                        threads = None,
+                        filename = None):
+    """Read a hyperslab of mdarray into a numpy array.
+
+    If threads is greater than 1, filename, the name of the file from
+    which mdarray was opened, must be specified: the hyperslab is split
+    along chunk boundaries and the parts are read concurrently, each thread
+    using its own handle on filename. These handles are kept for the next
+    reads until the file changes (see ClearMDArrayHandles())."""
+
+    if threads is not None and threads > 1 and not filename:
+        raise ValueError("filename must be specified to read with threads")
+
+    if not array_start_idx:
+        array_start_idx = [0] * mdarray.GetDimensionCount()
+    if not count:
+        count = list(_MDArrayInfo(mdarray)[0])
+    if not array_step:
+        array_step = [1] * mdarray.GetDimensionCount()
+
+    if buf_obj is None:
+        if not buffer_datatype:
+            _, typecode, buffer_datatype = _MDArrayInfo(mdarray)
+        else:
+            typecode, buffer_datatype = _ExtendedDataTypeToNumPyDataType(buffer_datatype)
+        buf_obj = numpy.empty(count, dtype=typecode)
+    else:
+        datatype = NumericTypeCodeToGDALTypeCode(buf_obj.dtype.type)
+        if not datatype:
+            raise ValueError("array does not have corresponding GDAL data type")
+
+        buffer_datatype = gdal.ExtendedDataType.Create(datatype)
+
+    if threads is not None and threads > 1:
+        ret = _MDArrayReadThreaded(mdarray, array_start_idx, count, array_step,
+                                   buffer_datatype, buf_obj, threads, filename)
+    else:
+        ret = MDArrayIONumPy(False, mdarray, buf_obj, array_start_idx, array_step, buffer_datatype)
+    if ret != 0:
+        _RaiseException()
+    return buf_obj
+
+def MDArrayReadSlice(mdarray, item):
+    """
+    Read the part of mdarray selected by numpy basic indexing with
+    integers, slices (including negative steps) and Ellipsis, in a single
+    MDArrayIONumPy call, and return it as a numpy array. Other kinds of
+    indices (field names, numpy.newaxis) go through GetView(). Called from
+    MDArray.ReadSlice.
+    """
+
+    if not isinstance(item, tuple):
+        item = (item,)
+    if not all(k is Ellipsis or isinstance(k, (slice, int, numpy.integer)) for k in item):
+        return mdarray[item].ReadAsArray()
+
+    shape, typecode, buffer_datatype = _MDArrayInfo(mdarray)
+    ndims = len(shape)
+    if any(k is Ellipsis for k in item):
+        i = [k is Ellipsis for k in item].index(True)
+        item = item[:i] + (slice(None),) * (ndims - len(item) + 1) + item[i + 1:]
+    if len(item) > ndims:
+        raise IndexError("too many indices for array")
+    item = item + (slice(None),) * (ndims - len(item))
+
+    array_start_idx = []
+    count = []
+    array_step = []
+    out_shape = []
+    for axis, (k, n) in enumerate(zip(item, shape)):
+        if isinstance(k, slice):
+            start, stop, step = k.indices(n)
+            size = len(range(start, stop, step))
+            array_start_idx.append(start if size else 0)
+            count.append(size)
+            array_step.append(step)
+            out_shape.append(size)
+        else:
+            if not -n <= k < n:
+                raise IndexError("index %d is out of bounds for axis %d with size %d" % (k, axis, n))
+            array_start_idx.append(int(k) % n)
+            count.append(1)
+            array_step.append(1)
+
+    buf_obj = numpy.empty(count, dtype=typecode)
+    if buf_obj.size:
+        if MDArrayIONumPy(False, mdarray, buf_obj, array_start_idx, array_step,
+                          buffer_datatype) != 0:
+            _RaiseException()
+            return None
+    buf_obj = buf_obj.reshape(out_shape)
+    if not out_shape:
+        return buf_obj[()]
+    return buf_obj
+
+def MDArrayIterChunks(mdarray, dims=None, prefetch=1, buffer_datatype=None,
+                      max_chunk_bytes=64 * 1024 * 1024):
+    """
+    Iterate over the chunks of mdarray, yielding (array_start_idx, array)
+    pairs in C order.
+
+    Chunks follow the native block size of mdarray along the dimensions
+    whose indices are in dims (all by default), and span whole dimensions
+    along the other ones. When the block size is unknown along a dimension,
+    GetProcessingChunkSize(max_chunk_bytes) is used.
+
+    If prefetch is not 0, AdviseRead() is called on groups of the current
+    chunk and up to prefetch following ones, which lets drivers such as
+    Zarr decode them concurrently before they are read. Called from
+    MDArray.IterChunks.
+    """
+
+    shape = [dim.GetSize() for dim in mdarray.GetDimensions()]
+    ndims = len(shape)
+    if dims is None:
+        dims = range(ndims)
+    dims = set(dims)
+    if any(not 0 <= d < ndims for d in dims):
+        raise ValueError("dims should be dimension indices lower than %d" % ndims)
+    if not all(shape):
+        return
+
+    chunk = list(mdarray.GetBlockSize())
+    if any(chunk[d] == 0 for d in dims):
+        processing_chunk = mdarray.GetProcessingChunkSize(max_chunk_bytes)
+        chunk = [c if c else p for c, p in zip(chunk, processing_chunk)]
+    chunk = [max(1, chunk[d]) if d in dims else shape[d] for d in range(ndims)]
+
+    def chunk_count(start):
+        return [min(c, n - s) for s, c, n in zip(start, chunk, shape)]
+
+    def volume(count):
+        size = 1
+        for n in count:
+            size *= n
+        return size
+
+    starts = itertools.product(*[range(0, n, c) for n, c in zip(shape, chunk)])
+    pending = collections.deque()
+    while True:
+        if not pending:
+            start = next(starts, None)
+            if start is None:
+                return
+            pending.append(start)
+            if prefetch:
+                # Extend the group while its bounding box is exactly the
+                # union of its chunks
+                box_start, box_end = list(start), [s + c for s, c in zip(start, chunk_count(start))]
+                total = volume(chunk_count(start))
+                while len(pending) <= prefetch:
+                    start = next(starts, None)
+                    if start is None:
+                        break
+                    count = chunk_count(start)
+                    new_start = [min(a, b) for a, b in zip(box_start, start)]
+                    new_end = [max(a, s + c) for a, s, c in zip(box_end, start, count)]
+                    if volume([e - b for b, e in zip(new_start, new_end)]) != total + volume(count):
+                        starts = itertools.chain([start], starts)
+                        break
+                    pending.append(start)
+                    box_start, box_end, total = new_start, new_end, total + volume(count)
+                if len(pending) > 1:
+                    mdarray.AdviseRead(box_start, [e - b for b, e in zip(box_start, box_end)])
+
+        start = list(pending.popleft())
+        array = MDArrayReadAsArray(mdarray, start, chunk_count(start),
+                                   buffer_datatype=buffer_datatype)
+        yield start, array
+
+
+class MDArrayStreamWriter(object):
+    """
+    Writer of arbitrary hyperslabs of a MDArray, for instance time steps,
+    that coalesces them into whole chunks before writing them.
+
+    Hyperslabs can be written in any order with Write(). Chunks, as
+    reported by GetBlockSize(), are written as soon as they are fully
+    covered, which avoids re-reading and recompressing partially written
+    chunks. When the data buffered for partial chunks would exceed
+    max_bytes, the oldest partial chunks are completed with the existing
+    content of the array and written, and chunks larger than max_bytes are
+    written as the hyperslabs come. Unchunked arrays, whose block sizes
+    are all 0, are written straight through. Close() (or leaving a with
+    block) writes the remaining partial chunks in chunk order.
+
+    If background is True, completed chunks are handed to a dedicated
+    thread which compresses and writes them, at most max_pending_bytes
+    being queued. Errors of that thread are raised by the next call to
+    Write(), Flush() or Close(), and mdarray must not be used by other
+    threads until the writer is closed.
+    """
+
+    def __init__(self, mdarray, max_bytes=64 * 1024 * 1024, background=False,
+                 max_pending_bytes=64 * 1024 * 1024):
+        shape = _MDArrayInfo(mdarray)[0]
+        block_size = mdarray.GetBlockSize()
+        self._mdarray = mdarray
+        self._closed = False
+        self._queue = _WriteBehindQueue(max_pending_bytes,
+                                        name='gdal_array MDArray writer') if background else None
+        if any(block_size):
+            chunk_shape = [block if block else size for block, size in zip(block_size, shape)]
+            self._chunks = _ChunkAccumulator(shape, chunk_shape, self._WriteChunk,
+                                             self._ReadChunk, max_bytes)
+        else:
+            # unchunked: nothing to coalesce
+            self._chunks = None
+
+    def _Write(self, start, array):
+        if MDArrayWriteArray(self._mdarray, array, list(start)) != 0:
+            raise RuntimeError("Write of chunk at %s failed" % list(start))
+
+    def _WriteChunk(self, start, array, copy=False):
+        if self._queue is None:
+            return MDArrayWriteArray(self._mdarray, array, list(start))
+        if copy or array.base is not None:
+            # the caller's array, or a view of it
+            array = array.copy()
+        self._queue.Submit(self._Write, (start, array), array.nbytes)
+        return 0
+
+    def _ReadChunk(self, start, count):
+        if self._queue is not None:
+            # the chunk might have been partially written before
+            self._queue.Wait()
+        return MDArrayReadAsArray(self._mdarray, list(start), list(count))
+
+    @property
+    def nbytes(self):
+        """Number of bytes currently buffered for partial chunks."""
+        return self._chunks.nbytes if self._chunks is not None else 0
+
+    @property
+    def pending_bytes(self):
+        """Number of bytes of chunks waiting to be written by the
+        background thread."""
+        return self._queue.pending_bytes if self._queue is not None else 0
+
+    def Write(self, array, array_start_idx=None):
+        """Write array at array_start_idx (the origin by default). Return 0
+        on success."""
+
+        if self._closed:
+            raise ValueError("MDArrayStreamWriter is closed")
+        array = numpy.asarray(array)
+        if not array_start_idx:
+            array_start_idx = [0] * len(array.shape)
+        if self._chunks is None:
+            return self._WriteChunk(tuple(array_start_idx), array, copy=True)
+        return self._chunks.Add(array, tuple(array_start_idx))
+
+    def Flush(self):
+        """Write all partial chunks, completed with the existing content of
+        the array, and wait for the background thread. Return 0 on
+        success."""
+
+        ret = self._chunks.Flush() if self._chunks is not None else 0
+        if self._queue is not None:
+            self._queue.Wait()
+        return ret
+
+    def Close(self):
+        """Flush the writer, which cannot be used afterwards."""
+
+        if self._closed:
+            return 0
+        self._closed = True
+        try:
+            ret = self._chunks.Flush() if self._chunks is not None else 0
+        finally:
+            if self._queue is not None:
+                self._queue.Close()
+        return ret
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.Close()
+
+def RATWriteArray(rat, array, field, start=0):
+    """
+    Pure Python implementation of writing a chunk of the RAT
+    from a numpy array. Type of array is coerced to one of the types
+    (int, double, string) supported. Called from RasterAttributeTable.WriteArray
+    """
+    if array is None:
+        raise ValueError("Expected array of dim 1")
+
+# if not the array type convert it to handle lists etc
+    if not isinstance(array, numpy.ndarray):
+        array = numpy.array(array)
+
+    if array.ndim != 1:
+        raise ValueError("Expected array of dim 1")
+
+    if (start + array.size) > rat.GetRowCount():
+        raise ValueError("Array too big to fit into RAT from start position")
+
+    array = _RATColumnArray(array)
+
+    ret = RATValuesIONumPyWrite(rat, field, start, array)
+    if ret != 0:
+        _RaiseException()
+    return ret
+
+def _RATColumnArray(array):
+    """Return array as a contiguous array of one of the types (int32,
+    double, bytes) supported by RATValuesIONumPyWrite, without copy when
+    it already is one."""
+
+    if numpy.issubdtype(array.dtype, numpy.integer):
+# is some type of integer - coerce to standard int, refusing to truncate
+        if array.dtype != numpy.int32:
+            info = numpy.iinfo(numpy.int32)
+            if array.size and (array.min() < info.min or array.max() > info.max):
+                raise ValueError("Integer values do not fit in a 32 bit RAT column")
+            return array.astype(numpy.int32)
+    elif numpy.issubdtype(array.dtype, numpy.floating):
+# is some type of floating point - coerce to double
+        if array.dtype != numpy.double:
+            return array.astype(numpy.double)
+    elif numpy.issubdtype(array.dtype, numpy.character):
+# cast away any kind of Unicode etc
+        if array.dtype.kind != 'S':
+            return array.astype(bytes)
+    else:
+        raise ValueError("Array not of a supported type (integer, double or string)")
+    return numpy.ascontiguousarray(array)
+
+def RATWriteColumns(rat, columns, start=0):
+    """
+    Write chunks of several columns of the RAT from a dict (or list of
+    pairs) of column names and 1D arrays. Missing columns are created with
+    a type matching their array, and rows are added if needed. Arrays that
+    already are int32, double or bytes are written without copy; integer
+    values that do not fit in 32 bits raise ValueError, nothing being
+    written. Called from RasterAttributeTable.WriteColumns
+    """
+    if hasattr(columns, 'items'):
+        columns = columns.items()
+
+    arrays = []
+    for name, array in columns:
+        if array is None:
+            raise ValueError("Expected array of dim 1")
+        if not isinstance(array, numpy.ndarray):
+            array = numpy.array(array)
+        if array.ndim != 1:
+            raise ValueError("Expected array of dim 1")
+        arrays.append((name, _RATColumnArray(array)))
+
+    indices = _RATColumnIndices(rat)
+    for name, array in arrays:
+        if name in indices:
+            continue
+        if array.dtype == numpy.int32:
+            col_type = gdalconst.GFT_Integer
+        elif array.dtype == numpy.double:
+            col_type = gdalconst.GFT_Real
+        else:
+            col_type = gdalconst.GFT_String
+        if rat.CreateColumn(name, col_type, gdalconst.GFU_Generic) != 0:
+            _RaiseException()
+            return 1
+        indices[name] = rat.GetColumnCount() - 1
+
+    row_count = max([start + array.size for _, array in arrays] + [0])
+    if row_count > rat.GetRowCount():
+        rat.SetRowCount(row_count)
+
+    for name, array in arrays:
+        ret = RATValuesIONumPyWrite(rat, indices[name], start, array)
+        if ret != 0:
+            _RaiseException()
+            return ret
+    return 0
+
+
+def _RATColumnIndices(rat):
+    return {rat.GetNameOfCol(i): i for i in reversed(range(rat.GetColumnCount()))}
+
+def RATReadStructuredArray(rat, fields=None, start=0, length=None, as_dict=False):
+    """
+    Read a chunk of several columns of the RAT, into a numpy structured
+    array with a field per column, or into a dict of column arrays if
+    as_dict is True. fields is a list of column names or indices (all
+    columns by default, duplicate or empty names being then made unique
+    with a _<n> suffix or as column_<index>). Called from
+    RasterAttributeTable.ReadAsStructuredArray
+    """
+    if length is None:
+        length = rat.GetRowCount() - start
+
+    names, col_indices = [], []
+    if fields is None:
+        for index in range(rat.GetColumnCount()):
+            base = rat.GetNameOfCol(index) or 'column_%d' % index
+            name, suffix = base, 0
+            while name in names:
+                suffix += 1
+                name = '%s_%d' % (base, suffix)
+            names.append(name)
+            col_indices.append(index)
+    else:
+        indices = None
+        for field in fields:
+            if isinstance(field, str):
+                if indices is None:
+                    indices = _RATColumnIndices(rat)
+                if field not in indices:
+                    raise ValueError("No column named %s" % field)
+                name, index = field, indices[field]
+            else:
+                name, index = rat.GetNameOfCol(field), field
+            if name in names:
+                raise ValueError("Column %s requested twice" % name)
+            names.append(name)
+            col_indices.append(index)
+
+    # types of the columns returned by RATValuesIONumPyRead, the width of
+    # string columns being only known once read
+    typecodes = {gdalconst.GFT_Integer: numpy.int32, gdalconst.GFT_Real: numpy.double}
+    columns = {}
+    for name, index in zip(names, col_indices):
+        if as_dict or rat.GetTypeOfCol(index) not in typecodes:
+            column = RATValuesIONumPyRead(rat, index, start, length)
+            if column is None:
+                _RaiseException()
+                return None
+            columns[name] = column
+    if as_dict:
+        return {name: columns[name] for name in names}
+
+    # other columns are read one at a time and copied right away, so that
+    # at most one of them is held besides the result
+    array = numpy.empty(length, dtype=[
+        (name, columns[name].dtype if name in columns else typecodes[rat.GetTypeOfCol(index)])
+        for name, index in zip(names, col_indices)])
+    for name, index in zip(names, col_indices):
+        column = columns.pop(name, None)
+        if column is None:
+            column = RATValuesIONumPyRead(rat, index, start, length)
+            if column is None:
+                _RaiseException()
+                return None
+        array[name] = column
+        del column
+    return array
+
+def CopyDatasetInfo(src, dst, xoff=0, yoff=0):
+    """
+    Copy georeferencing information and metadata from one dataset to another.
+    src: input dataset
+    dst: output dataset - It can be a ROI -
+    xoff, yoff:  dst's offset with respect to src in pixel/line.
+
+    Notes: Destination dataset must have update access.  Certain formats
+           do not support creation of geotransforms and/or gcps.
+
+    """
+
+    dst.SetMetadata(src.GetMetadata())
+
+
+
+#Check for geo transform
+    gt = src.GetGeoTransform()
+    if gt != (0, 1, 0, 0, 0, 1):
+        dst.SetProjection(src.GetProjectionRef())
+
+        if xoff == 0 and yoff == 0:
+            dst.SetGeoTransform(gt)
+        else:
+            dst.SetGeoTransform(tuple(gdal.GeoTransform(gt).Shift(xoff, yoff)))
+
+#Check for GCPs
+    elif src.GetGCPCount() > 0:
+
+        if (xoff == 0) and (yoff == 0):
+            dst.SetGCPs(src.GetGCPs(), src.GetGCPProjection())
+        else:
+            gcps = src.GetGCPs()
+#Shift gcps
+            new_gcps = []
+            for gcp in gcps:
+                ngcp = gdal.GCP()
+                ngcp.GCPX = gcp.GCPX
+                ngcp.GCPY = gcp.GCPY
+                ngcp.GCPZ = gcp.GCPZ
+                ngcp.GCPPixel = gcp.GCPPixel - xoff
+                ngcp.GCPLine = gcp.GCPLine - yoff
+                ngcp.Info = gcp.Info
+                ngcp.Id = gcp.Id
+                new_gcps.append(ngcp)
+
+            try:
+                dst.SetGCPs(new_gcps, src.GetGCPProjection())
+            except:
+                print("Failed to set GCPs")
+                return
+
+    return
@@ -0,0 +1,952 @@
+# Hand-maintained extensions of the gdal module of the GDAL bindings, kept
+# out of the SWIG generated gdal.py so that they survive its regeneration.
+# import.py links this module into the osgeo package of the versions it
+# applies to, and appends to their gdal.py:
+#
+#     from osgeo._gdal_ext import *
+#
+# which adds the functions and classes of __all__ to the gdal module, the
+# ones of the same name being replaced. The methods of the classes
+# decorated with _Extend() are added the same way to the gdal classes.
+
+import threading
+import time
+import weakref
+
+from osgeo import gdalconst
+from osgeo.gdal import *
+
+
+__all__ = [
+    'Translate', 'TranslateAsync', 'Warp', 'ZonalStatistics', 'BuildVRT',
+    'DatasetPool', 'SetDatasetPool', 'GetDatasetPool', 'SetAsyncMaxWorkers',
+    'GeoTransform'
+]
+
+
+def _Extend(cls):
+    """Class decorator adding the methods of the decorated class to cls,
+    replacing the ones of the same name."""
+
+    def extend(extension):
+        for name, value in vars(extension).items():
+            if not (name.startswith('__') and name.endswith('__')):
+                value.__qualname__ = '%s.%s' % (cls.__name__, name)
+                setattr(cls, name, value)
+        return extension
+    return extend
+
+
+def Translate(destName, srcDS, **kwargs):
+    """Convert a dataset.
+
+    Parameters
+    ----------
+    destName:
+        Output dataset name
+    srcDS:
+        a Dataset object or a filename
+    kwargs:
+        options: return of gdal.TranslateOptions(), string or array of strings
+        other keywords arguments of gdal.TranslateOptions().
+        If options is provided as a gdal.TranslateOptions() object, other keywords are ignored.
+    """
+
+    if 'options' not in kwargs or isinstance(kwargs['options'], (list, str)):
+        (opts, callback, callback_data) = TranslateOptions(**kwargs)
+    else:
+        (opts, callback, callback_data) = kwargs['options']
+    if isinstance(srcDS, str):
+        srcDS = _OpenPooled(srcDS)
+
+    return TranslateInternal(destName, srcDS, opts, callback, callback_data)
+
+async def TranslateAsync(destName, srcDS, **kwargs):
+    """Awaitable version of Translate(), run on the thread pool of the
+    asynchronous API (see SetAsyncMaxWorkers()). Cancelling the awaiting
+    task interrupts the translation through its progress callback.
+
+    A Dataset object passed as srcDS must not be used until the translation
+    completes."""
+
+    if 'options' not in kwargs or isinstance(kwargs['options'], (list, str)):
+        (opts, callback, callback_data) = TranslateOptions(**kwargs)
+    else:
+        (opts, callback, callback_data) = kwargs['options']
+
+    def translate(progress):
+        src = _OpenPooled(srcDS) if isinstance(srcDS, str) else srcDS
+        return TranslateInternal(destName, src, opts, progress, None)
+
+    return await _RunAsync(translate, callback, callback_data)
+
+
+def Warp(destNameOrDestDS, srcDSOrSrcDSTab, **kwargs):
+    """Warp one or several datasets.
+
+    Parameters
+    ----------
+    destNameOrDestDS:
+        Output dataset name or object
+    srcDSOrSrcDSTab:
+        an array of Dataset objects or filenames, or a Dataset object or a filename
+    kwargs:
+        options: return of gdal.WarpOptions(), string or array of strings,
+        other keywords arguments of gdal.WarpOptions().
+        If options is provided as a gdal.WarpOptions() object, other keywords are ignored.
+    """
+
+    if 'options' not in kwargs or isinstance(kwargs['options'], (list, str)):
+        (opts, callback, callback_data) = WarpOptions(**kwargs)
+    else:
+        (opts, callback, callback_data) = kwargs['options']
+    if isinstance(srcDSOrSrcDSTab, str):
+        srcDSTab = [_OpenPooled(srcDSOrSrcDSTab)]
+    elif isinstance(srcDSOrSrcDSTab, list):
+        srcDSTab = []
+        for elt in srcDSOrSrcDSTab:
+            if isinstance(elt, str):
+                srcDSTab.append(_OpenPooled(elt))
+            else:
+                srcDSTab.append(elt)
+    else:
+        srcDSTab = [srcDSOrSrcDSTab]
+
+    if isinstance(destNameOrDestDS, str):
+        return wrapper_GDALWarpDestName(destNameOrDestDS, srcDSTab, opts, callback, callback_data)
+    else:
+        return wrapper_GDALWarpDestDS(destNameOrDestDS, srcDSTab, opts, callback, callback_data)
+
+
+def ZonalStatistics(rasterDS, zonesLayer, **kwargs):
+    """Computes statistics of raster values per zone of a vector layer
+
+    Parameters
+    ----------
+    rasterDS:
+        a Dataset object or a filename
+    zonesLayer:
+        an OGR Layer, in the coordinate system of rasterDS
+    kwargs:
+        stats, band_list, zone_field, workers, histogram, all_touched, chunk_size,
+        callback, callback_data: see gdal_array.ZonalStatistics()
+
+    Returns a dict with a 'zone' array of zone ids and an array per statistic.
+    """
+
+    from osgeo import gdal_array
+
+    if isinstance(rasterDS, str):
+        rasterDS = _OpenPooled(rasterDS)
+        if rasterDS is None:
+            return None
+    return gdal_array.ZonalStatistics(rasterDS, zonesLayer, **kwargs)
+
+
+def BuildVRT(destName, srcDSOrSrcDSTab, **kwargs):
+    """Build a VRT from a list of datasets.
+
+    Parameters
+    ----------
+    destName:
+        Output dataset name.
+    srcDSOrSrcDSTab:
+        An array of Dataset objects or filenames, or a Dataset object or a filename.
+    kwargs:
+        options: return of gdal.BuildVRTOptions(), string or array of strings,
+        other keywords arguments of gdal.BuildVRTOptions().
+        If options is provided as a gdal.BuildVRTOptions() object,
+        other keywords are ignored.
+    """
+    if 'options' not in kwargs or isinstance(kwargs['options'], (list, str)):
+        (opts, callback, callback_data) = BuildVRTOptions(**kwargs)
+    else:
+        (opts, callback, callback_data) = kwargs['options']
+
+    srcDSTab = []
+    srcDSNamesTab = []
+    if isinstance(srcDSOrSrcDSTab, str):
+        srcDSNamesTab = [srcDSOrSrcDSTab]
+    elif isinstance(srcDSOrSrcDSTab, list):
+        for elt in srcDSOrSrcDSTab:
+            if isinstance(elt, str):
+                srcDSNamesTab.append(elt)
+            else:
+                srcDSTab.append(elt)
+        if srcDSTab and srcDSNamesTab:
+            raise Exception('Mix of names and dataset objects not supported')
+    else:
+        srcDSTab = [srcDSOrSrcDSTab]
+
+    # Only go through the pool when it can hold all the sources, not to
+    # evict them while they are opened
+    if srcDSNamesTab and _dataset_pool is not None and \
+       len(srcDSNamesTab) <= _dataset_pool.max_open:
+        pooledDSTab = []
+        # Errors are reported by BuildVRTInternalNames() if a source can't be opened
+        PushErrorHandler('CPLQuietErrorHandler')
+        try:
+            for name in srcDSNamesTab:
+                try:
+                    pooledDS = _dataset_pool.Open(name)
+                except RuntimeError:
+                    pooledDS = None
+                if pooledDS is None:
+                    break
+                pooledDSTab.append(pooledDS)
+            else:
+                srcDSTab = pooledDSTab
+        finally:
+            PopErrorHandler()
+
+    if srcDSTab:
+        return BuildVRTInternalObjects(destName, srcDSTab, opts, callback, callback_data)
+    else:
+        return BuildVRTInternalNames(destName, srcDSNamesTab, opts, callback, callback_data)
+
+
+def _FileSignature(utf8_path):
+    """Return the (modification time, size) of utf8_path, or None if it
+    can't be stat'ed, to detect that a file was rewritten."""
+    stat = VSIStatL(utf8_path)
+    if stat is None:
+        return None
+    return stat.mtime, stat.size
+
+
+class DatasetPool(object):
+    """Pool of opened datasets, keyed by (path, open flags, allowed drivers,
+    open options, thread), so that each thread gets its own handles.
+
+    At most max_open datasets are kept, the least recently used ones being
+    released first, and datasets unused for more than idle_timeout seconds
+    are released (None to keep them until evicted). Idle datasets are only
+    released when the pool is used, or when Expire() is called. Released
+    datasets are closed once no other reference to them remains.
+
+    A pooled dataset is reopened when the modification time or size of its
+    file, as reported by VSIStatL(), changed since it was opened. Rewrites
+    within the same second keeping the size are not detected: call
+    Release() after them.
+
+    See SetDatasetPool() to make Translate(), Warp(), BuildVRT() and
+    gdal_array.LoadFile() open their filename arguments through a pool."""
+
+    def __init__(self, max_open=64, idle_timeout=None):
+        import collections
+        self.max_open = max_open
+        self.idle_timeout = idle_timeout
+        self._datasets = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def OpenEx(self, utf8_path, nOpenFlags=0, allowed_drivers=None, open_options=None):
+        """Same as gdal.OpenEx(), returning a pooled dataset if available."""
+        key = (utf8_path, nOpenFlags,
+               tuple(allowed_drivers) if allowed_drivers else (),
+               tuple(open_options) if open_options else (),
+               threading.get_ident())
+        now = time.monotonic()
+        signature = _FileSignature(utf8_path)
+        with self._lock:
+            self._Expire(now)
+            entry = self._datasets.pop(key, None)
+            if entry is not None and entry[2] == signature:
+                self._datasets[key] = (entry[0], now, signature)
+                return entry[0]
+
+        ds = OpenEx(utf8_path, nOpenFlags, allowed_drivers, open_options)
+        if ds is None:
+            return None
+
+        with self._lock:
+            self._datasets[key] = (ds, now, signature)
+            while len(self._datasets) > self.max_open:
+                self._datasets.popitem(last=False)
+        return ds
+
+    def Open(self, utf8_path, eAccess=GA_ReadOnly):
+        """Same as gdal.Open(), returning a pooled dataset if available."""
+        flags = OF_RASTER | OF_VERBOSE_ERROR
+        if eAccess == GA_Update:
+            flags |= OF_UPDATE
+        return self.OpenEx(utf8_path, flags)
+
+    def _Expire(self, now):
+        if self.idle_timeout is None:
+            return
+        for key, (_, last_used, _) in list(self._datasets.items()):
+            if now - last_used <= self.idle_timeout:
+                break
+            del self._datasets[key]
+
+    def Expire(self):
+        """Release the datasets unused for more than idle_timeout seconds."""
+        with self._lock:
+            self._Expire(time.monotonic())
+
+    def Release(self, utf8_path):
+        """Release the pooled datasets of utf8_path, opened by any thread."""
+        with self._lock:
+            for key in [key for key in self._datasets if key[0] == utf8_path]:
+                del self._datasets[key]
+
+    def Clear(self):
+        """Release all pooled datasets."""
+        with self._lock:
+            self._datasets.clear()
+
+    def __len__(self):
+        return len(self._datasets)
+
+_dataset_pool = None
+
+def SetDatasetPool(pool):
+    """Make Translate(), Warp(), BuildVRT() and gdal_array.LoadFile() open
+    their filename arguments through pool, a DatasetPool. None disables it."""
+    global _dataset_pool
+    _dataset_pool = pool
+
+def GetDatasetPool():
+    """Return the DatasetPool set with SetDatasetPool(), or None."""
+    return _dataset_pool
+
+def _OpenPooled(utf8_path):
+    pool = _dataset_pool
+    if pool is None:
+        return Open(utf8_path)
+    return pool.Open(utf8_path)
+
+
+_async_lock = threading.Lock()
+_async_executor = None
+_async_max_workers = None
+# dataset handle address -> _AsyncHandleState, kept alive by the Python
+# objects using it, so that it does not outlive the dataset
+_async_states = weakref.WeakValueDictionary()
+_async_state_owners = weakref.WeakKeyDictionary()
+
+def SetAsyncMaxWorkers(max_workers):
+    """Set the number of worker threads running the *Async() functions and
+    methods. None selects the default of concurrent.futures.ThreadPoolExecutor."""
+    global _async_executor, _async_max_workers
+    with _async_lock:
+        _async_max_workers = max_workers
+        if _async_executor is not None:
+            _async_executor.shutdown(wait=False)
+            _async_executor = None
+
+def _GetAsyncExecutor():
+    global _async_executor
+    with _async_lock:
+        if _async_executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _async_executor = ThreadPoolExecutor(max_workers=_async_max_workers,
+                                                 thread_name_prefix='gdal_async')
+        return _async_executor
+
+async def _RunAsync(func, callback=None, callback_data=None):
+    """Run func(progress) on the asynchronous API thread pool. progress is
+    a GDAL progress callback that chains to callback and aborts the
+    operation when the awaiting task is cancelled."""
+    import asyncio
+
+    cancelled = threading.Event()
+
+    def progress(complete, message, data):
+        if cancelled.is_set():
+            return 0
+        if callback is not None:
+            return callback(complete, message, callback_data)
+        return 1
+
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_GetAsyncExecutor(), func, progress)
+    except asyncio.CancelledError:
+        cancelled.set()
+        raise
+
+def _CheckReadRasterBuffer(buffer):
+    """Check that buffer can be used as the output buffer of ReadRaster()."""
+    try:
+        view = memoryview(buffer)
+    except TypeError:
+        raise TypeError("buffer does not support the buffer protocol") from None
+    with view:
+        if view.readonly:
+            raise ValueError("buffer is read-only")
+        if not view.c_contiguous:
+            raise ValueError("buffer is not C-contiguous")
+
+class _AsyncHandleState(object):
+    """State of the asynchronous operations done on a dataset handle: the
+    lock serializing them."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+def _AsyncGetState(ds, owner=None):
+    """Return the _AsyncHandleState of the handle of ds, kept alive by ds
+    and owner (e.g. a Band of ds)."""
+    with _async_lock:
+        state = _async_states.get(int(ds.this))
+        if state is None:
+            state = _AsyncHandleState()
+            _async_states[int(ds.this)] = state
+        for obj in (ds, owner):
+            if obj is not None:
+                _async_state_owners[obj] = state
+        return state
+
+def _AsyncReopen(ds, state):
+    """Flush the pending writes of ds and return a new handle on its file for
+    the calling thread, or None if ds cannot be reopened (MEM dataset, or
+    opened with options such as OVERVIEW_LEVEL changing its layout)."""
+    from osgeo import _gdal_array_ext
+    with state.lock:
+        reopen_info = _gdal_array_ext._ReopenInfo(ds)
+    if reopen_info is None:
+        return None
+    return _gdal_array_ext._Reopen(reopen_info)
+
+
+def _ExtendedDataTypeSnapshot(dt):
+    """Return a description of an ExtendedDataType for Group.Snapshot()."""
+    klass = dt.GetClass()
+    if klass == GEDTC_NUMERIC:
+        return GetDataTypeName(dt.GetNumericDataType())
+    if klass == GEDTC_STRING:
+        return 'String'
+    return {'size': dt.GetSize(),
+            'components': [{'name': comp.GetName(),
+                            'offset': comp.GetOffset(),
+                            'dtype': _ExtendedDataTypeSnapshot(comp.GetType())}
+                           for comp in dt.GetComponents()]}
+
+def _AttributesSnapshot(obj):
+    """Return the attributes of a Group or MDArray as a dict for
+    Group.Snapshot()."""
+    attributes = {}
+    for attr in obj.GetAttributes() or []:
+        value = attr.Read()
+        if isinstance(value, (bytes, bytearray)):
+            value = {'raw': bytes(value).hex()}
+        elif isinstance(value, tuple):
+            value = list(value)
+        attributes[attr.GetName()] = value
+    return attributes
+
+
+class GeoTransform(tuple):
+    """
+    Affine geotransform (gt[0], ..., gt[5]) as returned by
+    Dataset.GetGeoTransform(), mapping pixel/line coordinates to
+    georeferenced coordinates:
+
+        X = gt[0] + pixel * gt[1] + line * gt[2]
+        Y = gt[3] + pixel * gt[4] + line * gt[5]
+
+    Being a tuple, it can be passed to Dataset.SetGeoTransform(). Its
+    conversion methods accept scalars or numpy arrays (they require numpy),
+    and are vectorized over arrays.
+    """
+
+    def __new__(cls, gt=(0, 1, 0, 0, 0, 1)):
+        gt = tuple(float(v) for v in gt)
+        if len(gt) != 6:
+            raise ValueError("geotransform must have 6 values")
+        return tuple.__new__(cls, gt)
+
+    @classmethod
+    def FromDataset(cls, ds):
+        """Return the geotransform of a Dataset."""
+        return cls(ds.GetGeoTransform())
+
+    def __repr__(self):
+        return 'GeoTransform(%s)' % (tuple(self),)
+
+    def Inverse(self):
+        """Return the inverse geotransform, mapping georeferenced coordinates
+        to pixel/line coordinates. Raises ValueError if it is not invertible."""
+
+        inverse = self.__dict__.get('_inverse')
+        if inverse is not None:
+            return inverse
+        gt = self
+        if gt[2] == 0 and gt[4] == 0 and gt[1] != 0 and gt[5] != 0:
+            inverse = GeoTransform((-gt[0] / gt[1], 1 / gt[1], 0,
+                                    -gt[3] / gt[5], 0, 1 / gt[5]))
+        else:
+            det = gt[1] * gt[5] - gt[2] * gt[4]
+            magnitude = max(max(abs(gt[1]), abs(gt[2])), max(abs(gt[4]), abs(gt[5])))
+            if abs(det) <= 1e-10 * magnitude * magnitude:
+                raise ValueError("geotransform is not invertible")
+            inv_det = 1 / det
+            inverse = GeoTransform((
+                (gt[2] * gt[3] - gt[0] * gt[5]) * inv_det,
+                gt[5] * inv_det,
+                -gt[2] * inv_det,
+                (-gt[1] * gt[3] + gt[0] * gt[4]) * inv_det,
+                -gt[4] * inv_det,
+                gt[1] * inv_det))
+        self.__dict__['_inverse'] = inverse
+        return inverse
+
+    def PixelToGeo(self, pixels, lines):
+        """Return the (X, Y) georeferenced coordinates of pixel/line
+        coordinates."""
+
+        import numpy
+        pixels = numpy.asarray(pixels, dtype=numpy.float64)
+        lines = numpy.asarray(lines, dtype=numpy.float64)
+        return (self[0] + pixels * self[1] + lines * self[2],
+                self[3] + pixels * self[4] + lines * self[5])
+
+    def GeoToPixel(self, xs, ys):
+        """Return the (pixel, line) fractional coordinates of georeferenced
+        coordinates. Use numpy.floor() to get the indices of the pixels
+        containing them."""
+
+        return self.Inverse().PixelToGeo(xs, ys)
+
+    def Shift(self, xoff, yoff):
+        """Return the geotransform of a window whose top left corner is at
+        pixel/line (xoff, yoff)."""
+
+        return GeoTransform((self[0] + xoff * self[1] + yoff * self[2], self[1], self[2],
+                             self[3] + xoff * self[4] + yoff * self[5], self[4], self[5]))
+
+    def BoundsFromWindow(self, xoff, yoff, xsize, ysize):
+        """Return the (minx, miny, maxx, maxy) georeferenced bounds of a
+        pixel/line window."""
+
+        xs, ys = self.PixelToGeo((xoff, xoff + xsize, xoff, xoff + xsize),
+                                 (yoff, yoff, yoff + ysize, yoff + ysize))
+        return (float(xs.min()), float(ys.min()), float(xs.max()), float(ys.max()))
+
+    def WindowFromBounds(self, minx, miny, maxx, maxy, xsize=None, ysize=None):
+        """Return the smallest (xoff, yoff, xsize, ysize) pixel/line window
+        covering georeferenced bounds. If the raster size is given, the
+        window is clipped to it, and None is returned if it is empty."""
+
+        import math
+        pixels, lines = self.GeoToPixel((minx, maxx, minx, maxx), (miny, miny, maxy, maxy))
+        # Tolerate rounding errors for bounds falling on pixel edges
+        eps = 1e-8
+        x0 = int(math.floor(pixels.min() + eps))
+        y0 = int(math.floor(lines.min() + eps))
+        x1 = int(math.ceil(pixels.max() - eps))
+        y1 = int(math.ceil(lines.max() - eps))
+        if xsize is not None:
+            x0, x1 = max(x0, 0), min(x1, xsize)
+        if ysize is not None:
+            y0, y1 = max(y0, 0), min(y1, ysize)
+        if (xsize is not None or ysize is not None) and (x1 <= x0 or y1 <= y0):
+            return None
+        return (x0, y0, x1 - x0, y1 - y0)
+
+
+@_Extend(Dataset)
+class _Dataset(object):
+    """Methods of gdal.Dataset."""
+
+    def ReadAsArray(self, xoff=0, yoff=0, xsize=None, ysize=None, buf_obj=None,
+                    buf_xsize=None, buf_ysize=None, buf_type=None,
+                    resample_alg=gdalconst.GRIORA_NearestNeighbour,
+                    callback=None,
+                    callback_data=None,
+                    interleave='band',
+                    band_list=None,
+                    threads=None,
+                    cache=None):
+        """ Reading a chunk of a GDAL band into a numpy array. The optional (buf_xsize,buf_ysize,buf_type)
+        parameters should generally not be specified if buf_obj is specified. The array is returned.
+        If threads is greater than 1, block aligned strips of the window are read concurrently,
+        each thread opening its own handle on the dataset. If cache is a gdal_array.TileCache,
+        the array is looked up in and stored into it, and is then read-only."""
+
+        from osgeo import gdal_array
+        return gdal_array.DatasetReadAsArray(self, xoff, yoff, xsize, ysize, buf_obj,
+                                              buf_xsize, buf_ysize, buf_type,
+                                              resample_alg=resample_alg,
+                                              callback=callback,
+                                              callback_data=callback_data,
+                                              interleave=interleave,
+                                              band_list=band_list,
+                                              threads=threads,
+                                              cache=cache)
+
+    def ReadAsMaskedArray(self, xoff=0, yoff=0, xsize=None, ysize=None,
+                          buf_xsize=None, buf_ysize=None, buf_type=None,
+                          resample_alg=gdalconst.GRIORA_NearestNeighbour,
+                          callback=None,
+                          callback_data=None,
+                          band_list=None):
+        """ Reading a chunk of the bands of the dataset into a numpy masked array, masking
+        the pixels that are invalid according to the mask band of each band. A shared
+        alpha band is read in the same request as the data. The masked array is returned."""
+
+        from osgeo import gdal_array
+        return gdal_array.DatasetReadAsMaskedArray(self, xoff, yoff, xsize, ysize,
+                                                    buf_xsize, buf_ysize, buf_type,
+                                                    resample_alg=resample_alg,
+                                                    callback=callback,
+                                                    callback_data=callback_data,
+                                                    band_list=band_list)
+
+    def AsyncWriter(self, max_pending_bytes=64 * 1024 * 1024):
+        """ Return a write-behind writer whose Write(array, xoff, yoff, ...) queues
+        WriteArray() calls run by a dedicated thread, so that computations overlap
+        with compression and I/O. Close() waits for the pending writes and flushes
+        the cache. The dataset must not be used meanwhile."""
+
+        from osgeo import gdal_array
+        return gdal_array.AsyncWriter(self, max_pending_bytes)
+
+    def SamplePoints(self, xs, ys, bands=None, overview=None, fill_value=0):
+        """ Return the values of the pixels containing the points of georeferenced coordinates
+        (xs, ys), as a numpy array of shape (number of points, number of bands). Points are
+        grouped by block, each block being read once. bands is the list of band numbers (all
+        bands by default), and overview an optional overview level to sample. Points outside
+        of the raster get fill_value."""
+
+        from osgeo import gdal_array
+        return gdal_array.DatasetSamplePoints(self, xs, ys, bands, overview, fill_value)
+
+    def GetRasterInfo(self, refresh=False):
+        """ Return an immutable snapshot of the sizes, data types, block sizes, nodata
+        values, scales and offsets of the bands of the dataset. The sizes, data types and
+        block sizes are cached, and only recomputed if refresh is True."""
+
+        from osgeo import gdal_array
+        return gdal_array.GetRasterInfo(self, refresh)
+
+    async def ReadAsArrayAsync(self, xoff=0, yoff=0, xsize=None, ysize=None, buf_obj=None,
+                               buf_xsize=None, buf_ysize=None, buf_type=None,
+                               resample_alg=gdalconst.GRIORA_NearestNeighbour,
+                               callback=None,
+                               callback_data=None,
+                               interleave='band',
+                               band_list=None):
+        """ Awaitable version of ReadAsArray(), run on the thread pool of the asynchronous
+        API (see SetAsyncMaxWorkers()). Each call flushes the dataset and reads through
+        a new handle on its file, so that concurrent reads don't wait for each other and
+        see the writes done before the call, synchronous or not. Datasets that can't be
+        reopened (MEM datasets, or opened with options changing their size) are read
+        through their own handle, serialized with the asynchronous writes. Cancelling the
+        awaiting task interrupts the read."""
+
+        def read(progress):
+            state = _AsyncGetState(self)
+            ds = _AsyncReopen(self, state)
+            kwargs = dict(buf_obj=buf_obj, buf_xsize=buf_xsize, buf_ysize=buf_ysize,
+                          buf_type=buf_type, resample_alg=resample_alg,
+                          callback=progress, interleave=interleave, band_list=band_list)
+            if ds is not None:
+                return ds.ReadAsArray(xoff, yoff, xsize, ysize, **kwargs)
+            with state.lock:
+                return self.ReadAsArray(xoff, yoff, xsize, ysize, **kwargs)
+
+        return await _RunAsync(read, callback, callback_data)
+
+    async def WriteArrayAsync(self, array, xoff=0, yoff=0,
+                              band_list=None,
+                              interleave='band',
+                              resample_alg=gdalconst.GRIORA_NearestNeighbour,
+                              callback=None,
+                              callback_data=None):
+        """ Awaitable version of WriteArray(), run on the thread pool of the asynchronous
+        API (see SetAsyncMaxWorkers()). Asynchronous writes to a dataset are serialized.
+        Cancelling the awaiting task interrupts the write."""
+
+        def write(progress):
+            state = _AsyncGetState(self)
+            with state.lock:
+                return self.WriteArray(array, xoff, yoff, band_list=band_list,
+                                       interleave=interleave, resample_alg=resample_alg,
+                                       callback=progress)
+
+        return await _RunAsync(write, callback, callback_data)
+
+    def IterBlocks(self, buf_type=None, buf_obj=None, interleave='band', band_list=None):
+        """ Iterate over the blocks of the dataset, following the block size of the
+        first band of band_list, and yield (xoff, yoff, array) tuples.
+        The arrays are views on a single buffer that is reused between iterations,
+        so they must be copied if they need to be kept."""
+
+        from osgeo import gdal_array
+        return gdal_array.DatasetIterBlocks(self, buf_type=buf_type, buf_obj=buf_obj,
+                                            interleave=interleave,
+                                            band_list=band_list)
+
+    def ReadRasterInto(self, buffer, xoff=0, yoff=0, xsize=None, ysize=None,
+                       buf_xsize=None, buf_ysize=None, buf_type=None,
+                       band_list=None,
+                       buf_pixel_space=None, buf_line_space=None, buf_band_space=None,
+                       resample_alg=gdalconst.GRIORA_NearestNeighbour,
+                       callback=None,
+                       callback_data=None):
+        """ Read a window of the dataset directly into buffer, which can be any writable
+        C-contiguous object supporting the buffer protocol (bytearray, mmap,
+        multiprocessing.shared_memory buffer, memoryview slice, numpy array...).
+        The layout of the pixels in buffer is set with buf_pixel_space, buf_line_space
+        and buf_band_space, in bytes. buffer is returned."""
+
+        _CheckReadRasterBuffer(buffer)
+        return self.ReadRaster(xoff, yoff, xsize, ysize,
+                               buf_xsize, buf_ysize, buf_type,
+                               band_list,
+                               buf_pixel_space, buf_line_space, buf_band_space,
+                               resample_alg, callback, callback_data,
+                               buf_obj=buffer)
+
+
+@_Extend(Group)
+class _Group(object):
+    """Methods of gdal.Group."""
+
+    def Snapshot(self, recursive=True):
+        """ Return a description of the group made of dicts, lists, strings and numbers, that
+        can be pickled or saved as JSON: its name, attributes, dimensions (with their indexing
+        variables), arrays (with their shape, data type, dimension full names, block size,
+        nodata value, unit, scale, offset and attributes), and, if recursive is True,
+        sub-groups. Arrays can then be opened with OpenMDArrayFromFullname() without walking
+        the hierarchy again."""
+
+        snapshot = {'name': self.GetName(),
+                    'full_name': self.GetFullName(),
+                    'attributes': _AttributesSnapshot(self),
+                    'dimensions': [],
+                    'arrays': {},
+                    'groups': {}}
+
+        for dim in self.GetDimensions() or []:
+            indexing_variable = dim.GetIndexingVariable()
+            snapshot['dimensions'].append({
+                'name': dim.GetName(),
+                'full_name': dim.GetFullName(),
+                'size': dim.GetSize(),
+                'type': dim.GetType(),
+                'direction': dim.GetDirection(),
+                'indexing_variable': indexing_variable.GetFullName() if indexing_variable else None})
+
+        for name in self.GetMDArrayNames() or []:
+            array = self.OpenMDArray(name)
+            if array is None:
+                continue
+            dt = array.GetDataType()
+            dims = array.GetDimensions() or []
+            array_snapshot = {'full_name': array.GetFullName(),
+                              'shape': [dim.GetSize() for dim in dims],
+                              'dtype': _ExtendedDataTypeSnapshot(dt),
+                              'dimensions': [dim.GetFullName() for dim in dims],
+                              'block_size': list(array.GetBlockSize()),
+                              'unit': array.GetUnit(),
+                              'attributes': _AttributesSnapshot(array)}
+            if dt.GetClass() == GEDTC_NUMERIC:
+                array_snapshot['nodata'] = array.GetNoDataValue()
+                array_snapshot['scale'] = array.GetScale()
+                array_snapshot['offset'] = array.GetOffset()
+            snapshot['arrays'][name] = array_snapshot
+
+        if recursive:
+            for name in self.GetGroupNames() or []:
+                group = self.OpenGroup(name)
+                if group is not None:
+                    snapshot['groups'][name] = group.Snapshot(recursive)
+
+        return snapshot
+
+
+@_Extend(MDArray)
+class _MDArray(object):
+    """Methods of gdal.MDArray."""
+
+    def ReadAsArray(self,
+                    array_start_idx = None,
+                    count = None,
+                    array_step = None,
+                    buffer_datatype = None,
+                    buf_obj = None,
+                    threads = None,
+                    filename = None):
+        """ Read a hyperslab into a numpy array. If threads is greater than 1, filename,
+        the file from which the array was opened, must be specified: the hyperslab is split
+        along chunk boundaries and read concurrently, each thread using its own handle (see
+        gdal_array.ClearMDArrayHandles())."""
+
+        from osgeo import gdal_array
+        return gdal_array.MDArrayReadAsArray(self, array_start_idx, count, array_step, buffer_datatype, buf_obj,
+                                              threads=threads, filename=filename)
+
+    def ReadSlice(self, item):
+        """ Read the part of the array selected by numpy basic indexing (integers, slices
+        with steps, Ellipsis) directly into a numpy array, without creating a view as
+        __getitem__ does."""
+
+        from osgeo import gdal_array
+        return gdal_array.MDArrayReadSlice(self, item)
+
+    def IterChunks(self, dims = None, prefetch = 1, buffer_datatype = None):
+        """ Iterate over (array_start_idx, array) pairs of chunks aligned on the block size,
+        along the dimensions of index in dims (all by default). AdviseRead() is called on the
+        current chunk and up to prefetch next ones so that they can be decoded together."""
+
+        from osgeo import gdal_array
+        return gdal_array.MDArrayIterChunks(self, dims, prefetch, buffer_datatype)
+
+    def StreamWriter(self, max_bytes = 64 * 1024 * 1024, background = False):
+        """ Return a writer whose Write(array, array_start_idx) buffers hyperslabs until
+        whole chunks are covered, and writes them in chunk order, so that chunks are not
+        recompressed. If background is True, chunks are compressed and written by a
+        dedicated thread. Close() writes the remaining partial chunks."""
+
+        from osgeo import gdal_array
+        return gdal_array.MDArrayStreamWriter(self, max_bytes, background)
+
+
+@_Extend(Band)
+class _Band(object):
+    """Methods of gdal.Band."""
+
+    def ReadRasterInto(self, buffer, xoff=0, yoff=0, xsize=None, ysize=None,
+                       buf_xsize=None, buf_ysize=None, buf_type=None,
+                       buf_pixel_space=None, buf_line_space=None,
+                       resample_alg=gdalconst.GRIORA_NearestNeighbour,
+                       callback=None,
+                       callback_data=None):
+        """ Read a window of the band directly into buffer, which can be any writable
+        C-contiguous object supporting the buffer protocol (bytearray, mmap,
+        multiprocessing.shared_memory buffer, memoryview slice, numpy array...).
+        The layout of the pixels in buffer is set with buf_pixel_space and
+        buf_line_space, in bytes. buffer is returned."""
+
+        _CheckReadRasterBuffer(buffer)
+        return self.ReadRaster(xoff, yoff, xsize, ysize,
+                               buf_xsize, buf_ysize, buf_type,
+                               buf_pixel_space, buf_line_space,
+                               resample_alg, callback, callback_data,
+                               buf_obj=buffer)
+
+    def ReadAsArray(self, xoff=0, yoff=0, win_xsize=None, win_ysize=None,
+                    buf_xsize=None, buf_ysize=None, buf_type=None, buf_obj=None,
+                    resample_alg=gdalconst.GRIORA_NearestNeighbour,
+                    callback=None,
+                    callback_data=None,
+                    cache=None):
+        """ Reading a chunk of a GDAL band into a numpy array. The optional (buf_xsize,buf_ysize,buf_type)
+        parameters should generally not be specified if buf_obj is specified. The array is returned.
+        If cache is a gdal_array.TileCache, the array is looked up in and stored into it, and is
+        then read-only."""
+
+        from osgeo import gdal_array
+
+        return gdal_array.BandReadAsArray(self, xoff, yoff,
+                                           win_xsize, win_ysize,
+                                           buf_xsize, buf_ysize, buf_type, buf_obj,
+                                           resample_alg=resample_alg,
+                                           callback=callback,
+                                           callback_data=callback_data,
+                                           cache=cache)
+
+    def ReadAsMaskedArray(self, xoff=0, yoff=0, win_xsize=None, win_ysize=None,
+                          buf_xsize=None, buf_ysize=None, buf_type=None,
+                          resample_alg=gdalconst.GRIORA_NearestNeighbour,
+                          callback=None,
+                          callback_data=None):
+        """ Reading a chunk of a GDAL band into a numpy masked array, masking the pixels
+        that are invalid according to GetMaskBand(). Nodata masks are computed from the
+        data, and an alpha band is read in the same request as the band. The masked
+        array is returned."""
+
+        from osgeo import gdal_array
+
+        return gdal_array.BandReadAsMaskedArray(self, xoff, yoff,
+                                                 win_xsize, win_ysize,
+                                                 buf_xsize, buf_ysize, buf_type,
+                                                 resample_alg=resample_alg,
+                                                 callback=callback,
+                                                 callback_data=callback_data)
+
+    def AsyncWriter(self, max_pending_bytes=64 * 1024 * 1024):
+        """ Return a write-behind writer whose Write(array, xoff, yoff, ...) queues
+        WriteArray() calls run by a dedicated thread, so that computations overlap
+        with compression and I/O. Close() waits for the pending writes and flushes
+        the cache. The band must not be used meanwhile."""
+
+        from osgeo import gdal_array
+        return gdal_array.AsyncWriter(self, max_pending_bytes)
+
+    async def ReadAsArrayAsync(self, xoff=0, yoff=0, win_xsize=None, win_ysize=None,
+                               buf_xsize=None, buf_ysize=None, buf_type=None, buf_obj=None,
+                               resample_alg=gdalconst.GRIORA_NearestNeighbour,
+                               callback=None,
+                               callback_data=None):
+        """ Awaitable version of ReadAsArray(), run on the thread pool of the asynchronous
+        API (see SetAsyncMaxWorkers()). Each call flushes the dataset and reads through
+        a new handle on its file, so that concurrent reads don't wait for each other and
+        see the writes done before the call, synchronous or not. Datasets that can't be
+        reopened (MEM datasets, or opened with options changing their size) are read
+        through their own handle, serialized with the asynchronous writes. Cancelling the
+        awaiting task interrupts the read."""
+
+        def read(progress):
+            ds = self.GetDataset()
+            state = _AsyncGetState(self if ds is None else ds, self)
+            band = None
+            if ds is not None and self.GetBand() > 0:
+                thread_ds = _AsyncReopen(ds, state)
+                if thread_ds is not None:
+                    band = thread_ds.GetRasterBand(self.GetBand())
+            kwargs = dict(buf_xsize=buf_xsize, buf_ysize=buf_ysize, buf_type=buf_type,
+                          buf_obj=buf_obj, resample_alg=resample_alg, callback=progress)
+            if band is not None:
+                return band.ReadAsArray(xoff, yoff, win_xsize, win_ysize, **kwargs)
+            with state.lock:
+                return self.ReadAsArray(xoff, yoff, win_xsize, win_ysize, **kwargs)
+
+        return await _RunAsync(read, callback, callback_data)
+
+    async def WriteArrayAsync(self, array, xoff=0, yoff=0,
+                              resample_alg=gdalconst.GRIORA_NearestNeighbour,
+                              callback=None,
+                              callback_data=None):
+        """ Awaitable version of WriteArray(), run on the thread pool of the asynchronous
+        API (see SetAsyncMaxWorkers()). Asynchronous writes to a dataset are serialized.
+        Cancelling the awaiting task interrupts the write."""
+
+        def write(progress):
+            ds = self.GetDataset()
+            state = _AsyncGetState(self if ds is None else ds, self)
+            with state.lock:
+                return self.WriteArray(array, xoff, yoff, resample_alg=resample_alg,
+                                       callback=progress)
+
+        return await _RunAsync(write, callback, callback_data)
+
+    def IterBlocks(self, buf_type=None, buf_obj=None):
+        """ Iterate over the blocks of the band and yield (xoff, yoff, array) tuples.
+        The arrays are views on a single buffer that is reused between iterations,
+        so they must be copied if they need to be kept."""
+
+        from osgeo import gdal_array
+        return gdal_array.BandIterBlocks(self, buf_type=buf_type, buf_obj=buf_obj)
+
+
+@_Extend(RasterAttributeTable)
+class _RasterAttributeTable(object):
+    """Methods of gdal.RasterAttributeTable."""
+
+    def WriteColumns(self, columns, start=0):
+        """ Write several columns from a dict of column names and arrays, creating missing
+        columns and rows. Arrays already of a RAT type are written without copy."""
+        from osgeo import gdal_array
+
+        return gdal_array.RATWriteColumns(self, columns, start)
+
+    def ReadAsStructuredArray(self, fields=None, start=0, length=None, as_dict=False):
+        """ Read several columns (names or indices, all columns by default) into a numpy
+        structured array, or into a dict of arrays if as_dict is True."""
+        from osgeo import gdal_array
+
+        return gdal_array.RATReadStructuredArray(self, fields, start, length, as_dict)